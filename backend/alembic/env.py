@@ -6,7 +6,7 @@ from alembic import context
 
 from app.config import get_settings
 
-from app.database import Base
+from app.database import Base, sync_database_url
 from app import models
 
 
@@ -19,7 +19,8 @@ target_metadata = Base.metadata
 
 
 def get_url():
-    return get_settings().database_url
+    # con DATABASE_URL async (asyncpg/aiosqlite) le migrazioni usano il driver sync
+    return sync_database_url(get_settings().database_url)
 
 
 def run_migrations_offline():
@@ -0,0 +1,64 @@
+"""assessment area scores
+
+Revision ID: 0002_area_scores
+Revises: 0001_initial
+Create Date: 2026-10-17 00:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.services import area_stats
+
+
+revision = "0002_area_scores"
+down_revision = "0001_initial"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    scores = op.create_table(
+        "assessment_area_scores",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("assessment_id", sa.Integer(), nullable=False),
+        sa.Column("area_id", sa.String(length=50), nullable=False),
+        sa.Column("support_sum", sa.Integer(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("low_count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["assessment_id"], ["assessments.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("assessment_id", "area_id", name="uq_assessment_area"),
+    )
+
+    # backfill dagli item già salvati
+    responses = sa.table(
+        "responses",
+        sa.column("assessment_id", sa.Integer()),
+        sa.column("item_id", sa.String()),
+        sa.column("support", sa.Integer()),
+    )
+    by_assessment = {}
+    for assessment_id, item_id, support in op.get_bind().execute(
+        sa.select(responses.c.assessment_id, responses.c.item_id, responses.c.support)
+    ):
+        by_assessment.setdefault(assessment_id, []).append({"item_id": item_id, "support": support})
+
+    rows = []
+    for assessment_id, items in by_assessment.items():
+        for area_id, (total, count, low) in area_stats(items).items():
+            rows.append(
+                {
+                    "assessment_id": assessment_id,
+                    "area_id": area_id,
+                    "support_sum": total,
+                    "count": count,
+                    "low_count": low,
+                }
+            )
+    if rows:
+        op.bulk_insert(scores, rows)
+
+
+def downgrade():
+    op.drop_table("assessment_area_scores")
@@ -0,0 +1,73 @@
+"""area scores for profile dashboard
+
+Revision ID: 0003_area_scores_dashboard
+Revises: 0002_area_scores
+Create Date: 2026-10-17 00:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003_area_scores_dashboard"
+down_revision = "0002_area_scores"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("assessment_area_scores") as batch:
+        batch.add_column(sa.Column("avg", sa.Float(), nullable=True))
+        batch.add_column(sa.Column("profile_id", sa.Integer(), nullable=True))
+        batch.add_column(sa.Column("assessment_date", sa.Date(), nullable=True))
+        batch.add_column(sa.Column("in_dashboard", sa.Boolean(), server_default=sa.false(), nullable=False))
+    op.create_index(
+        "ix_area_scores_profile_dashboard",
+        "assessment_area_scores",
+        ["profile_id", "in_dashboard", "assessment_date"],
+    )
+
+    scores = sa.table(
+        "assessment_area_scores",
+        sa.column("assessment_id", sa.Integer()),
+        sa.column("support_sum", sa.Integer()),
+        sa.column("count", sa.Integer()),
+        sa.column("avg", sa.Float()),
+        sa.column("profile_id", sa.Integer()),
+        sa.column("assessment_date", sa.Date()),
+        sa.column("in_dashboard", sa.Boolean()),
+    )
+    assessments = sa.table(
+        "assessments",
+        sa.column("id", sa.Integer()),
+        sa.column("profile_id", sa.Integer()),
+        sa.column("assessment_date", sa.Date()),
+        sa.column("status", sa.String()),
+        sa.column("is_deleted", sa.Boolean()),
+    )
+
+    def from_assessment(expr):
+        return sa.select(expr).where(assessments.c.id == scores.c.assessment_id).scalar_subquery()
+
+    op.execute(
+        scores.update().values(
+            avg=sa.case((scores.c.count > 0, sa.cast(scores.c.support_sum, sa.Float) / scores.c.count), else_=None),
+            profile_id=from_assessment(assessments.c.profile_id),
+            assessment_date=from_assessment(assessments.c.assessment_date),
+            in_dashboard=from_assessment(
+                sa.case(
+                    (sa.and_(assessments.c.status == "finalized", assessments.c.is_deleted.is_(sa.false())), sa.true()),
+                    else_=sa.false(),
+                )
+            ),
+        )
+    )
+
+
+def downgrade():
+    op.drop_index("ix_area_scores_profile_dashboard", table_name="assessment_area_scores")
+    with op.batch_alter_table("assessment_area_scores") as batch:
+        batch.drop_column("in_dashboard")
+        batch.drop_column("assessment_date")
+        batch.drop_column("profile_id")
+        batch.drop_column("avg")
@@ -0,0 +1,22 @@
+"""responses item/support index
+
+Revision ID: 0004_responses_item_index
+Revises: 0003_area_scores_dashboard
+Create Date: 2026-10-17 00:00:00
+"""
+
+from alembic import op
+
+
+revision = "0004_responses_item_index"
+down_revision = "0003_area_scores_dashboard"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_responses_item_support", "responses", ["item_id", "support"])
+
+
+def downgrade():
+    op.drop_index("ix_responses_item_support", table_name="responses")
@@ -0,0 +1,49 @@
+"""profile latest finalized assessment pointer
+
+Revision ID: 0005_profile_latest_assessment
+Revises: 0004_responses_item_index
+Create Date: 2026-10-17 00:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005_profile_latest_assessment"
+down_revision = "0004_responses_item_index"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("profiles") as batch:
+        batch.add_column(sa.Column("latest_assessment_id", sa.Integer(), nullable=True))
+    op.create_index(op.f("ix_profiles_latest_assessment_id"), "profiles", ["latest_assessment_id"])
+
+    profiles = sa.table("profiles", sa.column("id", sa.Integer()), sa.column("latest_assessment_id", sa.Integer()))
+    assessments = sa.table(
+        "assessments",
+        sa.column("id", sa.Integer()),
+        sa.column("profile_id", sa.Integer()),
+        sa.column("assessment_date", sa.Date()),
+        sa.column("status", sa.String()),
+        sa.column("is_deleted", sa.Boolean()),
+    )
+    latest = (
+        sa.select(assessments.c.id)
+        .where(
+            assessments.c.profile_id == profiles.c.id,
+            assessments.c.status == "finalized",
+            assessments.c.is_deleted.is_(sa.false()),
+        )
+        .order_by(assessments.c.assessment_date.desc(), assessments.c.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    op.execute(profiles.update().values(latest_assessment_id=latest))
+
+
+def downgrade():
+    op.drop_index(op.f("ix_profiles_latest_assessment_id"), table_name="profiles")
+    with op.batch_alter_table("profiles") as batch:
+        batch.drop_column("latest_assessment_id")
@@ -0,0 +1,28 @@
+"""indexes for keyset pagination
+
+Revision ID: 0006_listing_indexes
+Revises: 0005_profile_latest_assessment
+Create Date: 2026-10-17 00:00:00
+"""
+
+from alembic import op
+
+
+revision = "0006_listing_indexes"
+down_revision = "0005_profile_latest_assessment"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_profiles_display_name_id", "profiles", ["display_name", "id"])
+    op.create_index("ix_assessments_date_id", "assessments", ["assessment_date", "id"])
+    op.create_index("ix_assessments_profile_date", "assessments", ["profile_id", "assessment_date"])
+    op.create_index("ix_plans_assessment_version", "plans", ["assessment_id", "version"])
+
+
+def downgrade():
+    op.drop_index("ix_plans_assessment_version", table_name="plans")
+    op.drop_index("ix_assessments_profile_date", table_name="assessments")
+    op.drop_index("ix_assessments_date_id", table_name="assessments")
+    op.drop_index("ix_profiles_display_name_id", table_name="profiles")
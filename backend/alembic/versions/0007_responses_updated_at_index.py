@@ -0,0 +1,22 @@
+"""responses updated_at index
+
+Revision ID: 0007_responses_updated_at_index
+Revises: 0006_listing_indexes
+Create Date: 2026-10-17 00:00:00
+"""
+
+from alembic import op
+
+
+revision = "0007_responses_updated_at_index"
+down_revision = "0006_listing_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_responses_updated_at", "responses", ["updated_at"])
+
+
+def downgrade():
+    op.drop_index("ix_responses_updated_at", table_name="responses")
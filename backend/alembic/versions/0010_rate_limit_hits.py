@@ -0,0 +1,33 @@
+"""rate limit hits
+
+Revision ID: 0010_rate_limit_hits
+Revises: 0009_user_token_version
+Create Date: 2026-10-17 00:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0010_rate_limit_hits"
+down_revision = "0009_user_token_version"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "rate_limit_hits",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("key", sa.String(length=200), nullable=False),
+        sa.Column("ts", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_rate_limit_hits_key_ts", "rate_limit_hits", ["key", "ts"])
+    op.create_index("ix_rate_limit_hits_ts", "rate_limit_hits", ["ts"])
+
+
+def downgrade():
+    op.drop_index("ix_rate_limit_hits_ts", table_name="rate_limit_hits")
+    op.drop_index("ix_rate_limit_hits_key_ts", table_name="rate_limit_hits")
+    op.drop_table("rate_limit_hits")
@@ -0,0 +1,80 @@
+"""audit log created_at index and monthly partitions (PostgreSQL)
+
+Revision ID: 0011_audit_partitions
+Revises: 0010_rate_limit_hits
+Create Date: 2026-10-17 00:00:00
+"""
+
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0011_audit_partitions"
+down_revision = "0010_rate_limit_hits"
+branch_labels = None
+depends_on = None
+
+
+def _month_starts(first: date, last: date):
+    current = first.replace(day=1)
+    while current <= last:
+        following = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+        yield current, following
+        current = following
+
+
+def _partition_postgresql():
+    # audit_logs diventa una tabella partizionata per mese su created_at.
+    # La chiave primaria deve includere la colonna di partizione.
+    bind = op.get_bind()
+    op.execute("ALTER TABLE audit_logs RENAME TO audit_logs_unpartitioned")
+    op.execute("ALTER SEQUENCE audit_logs_id_seq OWNED BY NONE")
+    op.execute(
+        """
+        CREATE TABLE audit_logs (
+            id INTEGER NOT NULL DEFAULT nextval('audit_logs_id_seq'),
+            user_id INTEGER REFERENCES users (id),
+            action VARCHAR(50) NOT NULL,
+            entity_type VARCHAR(50) NOT NULL,
+            entity_id INTEGER,
+            details TEXT,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    first = bind.execute(sa.text("SELECT min(created_at) FROM audit_logs_unpartitioned")).scalar()
+    today = date.today()
+    first = first.date() if first else today
+    last = date(today.year + (today.month + 1) // 12, (today.month + 1) % 12 + 1, 1)
+    for start, end in _month_starts(first, last):
+        op.execute(
+            f"CREATE TABLE audit_logs_{start:%Y_%m} PARTITION OF audit_logs "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    # rete di sicurezza se il comando di retention non crea in tempo i mesi futuri
+    op.execute("CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT")
+    op.execute("INSERT INTO audit_logs SELECT * FROM audit_logs_unpartitioned")
+    op.execute("DROP TABLE audit_logs_unpartitioned")
+    op.execute("ALTER SEQUENCE audit_logs_id_seq OWNED BY audit_logs.id")
+
+
+def upgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        _partition_postgresql()
+    op.create_index("ix_audit_logs_created_at", "audit_logs", ["created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_audit_logs_created_at", table_name="audit_logs")
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("ALTER TABLE audit_logs RENAME TO audit_logs_partitioned")
+        op.execute("ALTER SEQUENCE audit_logs_id_seq OWNED BY NONE")
+        op.execute("CREATE TABLE audit_logs (LIKE audit_logs_partitioned INCLUDING DEFAULTS)")
+        op.execute("INSERT INTO audit_logs SELECT * FROM audit_logs_partitioned")
+        op.execute("DROP TABLE audit_logs_partitioned CASCADE")
+        op.execute("ALTER TABLE audit_logs ADD PRIMARY KEY (id)")
+        op.execute("ALTER TABLE audit_logs ADD FOREIGN KEY (user_id) REFERENCES users (id)")
+        op.execute("ALTER SEQUENCE audit_logs_id_seq OWNED BY audit_logs.id")
@@ -0,0 +1,33 @@
+"""table versions for conditional GET
+
+Revision ID: 0012_table_versions
+Revises: 0011_audit_partitions
+Create Date: 2026-10-17 00:00:00
+"""
+
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0012_table_versions"
+down_revision = "0011_audit_partitions"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table = op.create_table(
+        "table_versions",
+        sa.Column("name", sa.String(length=50), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    now = datetime.now(timezone.utc)
+    op.bulk_insert(table, [{"name": name, "version": 0, "updated_at": now} for name in ("profiles", "assessments")])
+
+
+def downgrade():
+    op.drop_table("table_versions")
@@ -0,0 +1,113 @@
+"""Modalità database async.
+
+Si attiva con un DATABASE_URL che usa un driver async
+(postgresql+asyncpg://... oppure sqlite+aiosqlite://...). In questa modalità:
+
+- negli handler async (login) get_db restituisce la Session sincrona di una
+  AsyncSession, con lo stesso contratto di unit of work (un commit a fine
+  richiesta); le dipendenze sincrone che la usano girano sul loop con
+  greenlet_spawn e il codice ORM dell'handler passa da run_db;
+- gli handler sincroni restano nel threadpool con la Session sync: il loro lavoro
+  CPU (sintesi, serializzazione delle risposte) non blocca le altre richieste;
+- il lavoro bloccante chiamato dalle dipendenze sul loop (bcrypt) passa da
+  wait_future, che lo attende senza bloccare il loop.
+
+Alembic, CLI, worker ed export in streaming continuano a usare l'engine sync.
+"""
+
+import asyncio
+import functools
+import inspect
+from concurrent.futures import Future
+
+from fastapi.routing import APIRoute
+from sqlalchemy.util import await_only, greenlet_spawn
+from sqlalchemy.util.concurrency import in_greenlet
+from starlette.concurrency import run_in_threadpool
+
+from .config import get_settings
+from .database import ASYNC_MODE, AppSession, configure_sqlite, engine_options
+
+
+if ASYNC_MODE:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    _url = get_settings().database_url
+    async_engine = create_async_engine(_url, future=True, **engine_options(_url))
+    if _url.startswith("sqlite"):
+        configure_sqlite(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, sync_session_class=AppSession, autoflush=False)
+    # READ_DATABASE_URL con lo stesso driver async di DATABASE_URL
+    _read_url = get_settings().read_database_url
+    AsyncReadSessionLocal = None
+    if _read_url:
+        AsyncReadSessionLocal = async_sessionmaker(
+            create_async_engine(_read_url, future=True, **engine_options(_read_url)),
+            sync_session_class=AppSession,
+            autoflush=False,
+        )
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db.sync_session
+            if db.in_transaction():
+                await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+
+def _in_greenlet(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await greenlet_spawn(fn, *args, **kwargs)
+
+    # annotazioni risolte nel modulo di origine (main usa "from __future__ import annotations")
+    wrapper.__signature__ = inspect.signature(fn, eval_str=True)
+    return wrapper
+
+
+# dipendenza sync -> sostituta async, applicate solo alle route con handler async
+async_overrides = {}
+
+
+class _AsyncRouteOverrides:
+    def __init__(self, provider):
+        self.provider = provider
+
+    @property
+    def dependency_overrides(self):
+        # gli override dell'app (es. nei test) hanno la precedenza
+        return {**async_overrides, **getattr(self.provider, "dependency_overrides", {})}
+
+
+class DatabaseRoute(APIRoute):
+    def __init__(self, path, endpoint, **kwargs):
+        if ASYNC_MODE and asyncio.iscoroutinefunction(endpoint):
+            kwargs["dependency_overrides_provider"] = _AsyncRouteOverrides(kwargs.get("dependency_overrides_provider"))
+        super().__init__(path, endpoint, **kwargs)
+
+
+def install_async_mode(app, get_db, *db_dependencies) -> None:
+    # da chiamare prima di registrare le route; db_dependencies: dipendenze sync che usano la sessione
+    app.router.route_class = DatabaseRoute
+    if not ASYNC_MODE:
+        return
+    async_overrides[get_db] = get_async_db
+    for dependency in db_dependencies:
+        async_overrides[dependency] = _in_greenlet(dependency)
+
+
+async def run_db(fn, *args):
+    # codice ORM sincrono chiamato da un handler async
+    if ASYNC_MODE:
+        return await greenlet_spawn(fn, *args)
+    return await run_in_threadpool(fn, *args)
+
+
+def wait_future(future: Future):
+    if in_greenlet():
+        return await_only(asyncio.wrap_future(future))
+    return future.result()
@@ -1,15 +1,152 @@
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
+from . import metrics
+from .config import get_settings
+from .database import after_commit
 from .models import AuditLog
+from .sqlitewriter import write_transaction
+
+
+logger = logging.getLogger("edufad.audit")
+
+# AUDIT_MODE:
+#   "buffered" (default) -> le voci vanno in un buffer in memoria, scritto da un
+#                           thread in INSERT multi-riga (per dimensione o tempo)
+#   "sync"               -> la voce entra nella transazione del chiamante e viene
+#                           scritta con il suo commit (audit durevole)
+# In entrambi i casi la voce segue l'esito della transazione del chiamante.
+AUDIT_MODES = ("buffered", "sync")
+
+
+class AuditBuffer:
+    def __init__(self, batch_size: int, flush_seconds: float, max_pending: int):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self._rows: list[dict] = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+
+    def enqueue(self, row: dict) -> None:
+        with self._cond:
+            if self._thread is None:
+                self._start()
+            self._rows.append(row)
+            pending = len(self._rows)
+            if pending >= self.batch_size:
+                self._cond.notify()
+        metrics.set_gauge("audit.pending", pending)
+        if pending >= self.max_pending:
+            # il thread non tiene il passo: scrive il chiamante
+            self.flush()
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    batch, self._rows = self._rows[: self.batch_size], self._rows[self.batch_size :]
+                if not batch:
+                    return
+                try:
+                    with write_transaction() as conn:
+                        conn.execute(insert(AuditLog).values(batch))
+                except Exception:
+                    logger.exception("Scrittura audit fallita, %s voci rimesse in coda.", len(batch))
+                    with self._cond:
+                        self._rows[:0] = batch
+                        overflow = len(self._rows) - self.max_pending * 2
+                        if overflow > 0:
+                            del self._rows[:overflow]
+                            metrics.incr("audit.dropped", overflow)
+                    return
+                metrics.incr("audit.written", len(batch))
+                metrics.incr("audit.batches")
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=10)
+        self.flush()
+        self._stopping = False
 
+    def _start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
 
-def log_action(db: Session, user_id: int | None, action: str, entity_type: str, entity_id: int | None, details: str | None = None) -> None:
-    entry = AuditLog(
-        user_id=user_id,
-        action=action,
-        entity_type=entity_type,
-        entity_id=entity_id,
-        details=details,
+    def _run(self) -> None:
+        while True:
+            deadline = time.monotonic() + self.flush_seconds
+            with self._cond:
+                while not self._stopping and len(self._rows) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._stopping:
+                    return
+            self.flush()
+
+
+_settings = get_settings()
+_buffer = AuditBuffer(_settings.audit_batch_size, _settings.audit_flush_seconds, _settings.audit_max_pending)
+# garantisce lo svuotamento anche fuori dall'app web (CLI, script)
+atexit.register(_buffer.stop)
+
+
+def log_action(
+    db: Session,
+    user_id: int | None,
+    action: str,
+    entity_type: str,
+    entity_id: int | None,
+    details: str | None = None,
+    mode: str | None = None,
+) -> None:
+    mode = mode or get_settings().audit_mode
+    if mode not in AUDIT_MODES:
+        raise ValueError(f"AUDIT_MODE non valido: {mode}")
+    if mode == "buffered":
+        row = {
+            "user_id": user_id,
+            "action": action,
+            "entity_type": entity_type,
+            "entity_id": entity_id,
+            "details": details,
+            "created_at": datetime.utcnow(),
+        }
+        if db.in_transaction():
+            # niente audit per operazioni poi annullate da un rollback
+            after_commit(db, lambda: _buffer.enqueue(row))
+        else:
+            _buffer.enqueue(row)
+        return
+    # sync: la voce viene scritta dal commit della transazione del chiamante
+    db.add(
+        AuditLog(
+            user_id=user_id,
+            action=action,
+            entity_type=entity_type,
+            entity_id=entity_id,
+            details=details,
+        )
     )
-    db.add(entry)
-    db.commit()
+
+
+def flush_audit() -> None:
+    _buffer.flush()
+
+
+def shutdown_audit() -> None:
+    _buffer.stop()
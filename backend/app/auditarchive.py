@@ -0,0 +1,167 @@
+import gzip
+import json
+import logging
+import os
+from datetime import date, datetime
+from pathlib import Path
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from .models import AuditLog
+
+
+# Retention dell'audit: i mesi più vecchi di AUDIT_RETENTION_MONTHS escono dalla
+# tabella e finiscono in un file JSONL compresso per mese (audit-AAAA-MM.jsonl.gz).
+# Su PostgreSQL audit_logs è partizionata per mese (migrazione 0011): il mese
+# archiviato si elimina staccando la partizione invece che con una DELETE.
+
+logger = logging.getLogger("edufad.audit")
+
+ARCHIVE_FIELDS = ("id", "user_id", "action", "entity_type", "entity_id", "details", "created_at")
+
+
+def _month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _next_month(value: date) -> date:
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def _archive_path(archive_dir: str, month: date) -> Path:
+    return Path(archive_dir) / f"audit-{month:%Y-%m}.jsonl.gz"
+
+
+def _is_partitioned(db: Session) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return bool(
+        db.execute(
+            text("SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = 'audit_logs'")
+        ).scalar()
+    )
+
+
+def _partition_exists(db: Session, name: str) -> bool:
+    return bool(db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar())
+
+
+def ensure_partitions(db: Session, months_ahead: int = 2) -> list[str]:
+    if not _is_partitioned(db):
+        return []
+    created = []
+    month = _month_start(date.today())
+    for _ in range(months_ahead + 1):
+        name = f"audit_logs_{month:%Y_%m}"
+        following = _next_month(month)
+        if not _partition_exists(db, name):
+            try:
+                with db.begin_nested():
+                    db.execute(
+                        text(
+                            f"CREATE TABLE {name} PARTITION OF audit_logs "
+                            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+                        )
+                    )
+                created.append(name)
+            except Exception:
+                # righe del mese già finite nella partizione DEFAULT
+                logger.warning("Impossibile creare la partizione %s.", name, exc_info=True)
+        month = following
+    return created
+
+
+def _write_archive(path: Path, rows: list[dict]) -> None:
+    # un mese può essere archiviato in più passate: si uniscono le righe già presenti
+    existing = list(read_archive(path)) if path.exists() else []
+    seen = {row["id"] for row in existing}
+    merged = existing + [row for row in rows if row["id"] not in seen]
+    merged.sort(key=lambda row: row["id"])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8") as handle:
+        for row in merged:
+            handle.write(json.dumps(row, default=str, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+
+
+def archive_audit(db: Session, archive_dir: str, retention_months: int) -> dict[str, int]:
+    # si conservano il mese corrente e i retention_months precedenti
+    index = date.today().year * 12 + date.today().month - 1 - retention_months
+    cutoff = date(index // 12, index % 12 + 1, 1)
+    oldest = db.query(func.min(AuditLog.created_at)).filter(AuditLog.created_at < datetime.combine(cutoff, datetime.min.time())).scalar()
+    if oldest is None:
+        return {}
+
+    partitioned = _is_partitioned(db)
+    archived = {}
+    month = _month_start(oldest.date())
+    while month < cutoff:
+        start = datetime.combine(month, datetime.min.time())
+        end = datetime.combine(_next_month(month), datetime.min.time())
+        rows = [
+            {field: getattr(entry, field) for field in ARCHIVE_FIELDS}
+            for entry in db.query(AuditLog)
+            .filter(AuditLog.created_at >= start, AuditLog.created_at < end)
+            .order_by(AuditLog.id)
+            .yield_per(1000)
+        ]
+        if rows:
+            # prima il file, poi la cancellazione: un errore lascia le righe nel DB
+            _write_archive(_archive_path(archive_dir, month), rows)
+            partition = f"audit_logs_{month:%Y_%m}"
+            if partitioned and _partition_exists(db, partition):
+                db.execute(text(f"ALTER TABLE audit_logs DETACH PARTITION {partition}"))
+                db.execute(text(f"DROP TABLE {partition}"))
+            db.query(AuditLog).filter(AuditLog.created_at >= start, AuditLog.created_at < end).delete(
+                synchronize_session=False
+            )
+            db.commit()
+            archived[f"{month:%Y-%m}"] = len(rows)
+        month = _next_month(month)
+    return archived
+
+
+def read_archive(path: Path):
+    with gzip.open(path, "rt", encoding="utf-8") as handle:
+        for line in handle:
+            yield json.loads(line)
+
+
+def search_archive(
+    archive_dir: str,
+    user_id: int | None = None,
+    action: str | None = None,
+    entity_type: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    before_id: int | None = None,
+    limit: int = 100,
+) -> list[dict]:
+    # dal mese più recente al più vecchio; i file fuori dall'intervallo di date
+    # non vengono aperti. Risultati in id decrescente, come la tabella.
+    results = []
+    for path in sorted(Path(archive_dir).glob("audit-*.jsonl.gz"), reverse=True):
+        month = date.fromisoformat(path.name[6:13] + "-01")
+        if date_from and _next_month(month) <= date_from:
+            break
+        if date_to and month > date_to:
+            continue
+        matches = []
+        for row in read_archive(path):
+            created = row["created_at"][:10]
+            if (
+                (before_id is None or row["id"] < before_id)
+                and (user_id is None or row["user_id"] == user_id)
+                and (action is None or row["action"] == action)
+                and (entity_type is None or row["entity_type"] == entity_type)
+                and (date_from is None or created >= date_from.isoformat())
+                and (date_to is None or created <= date_to.isoformat())
+            ):
+                matches.append(row)
+        matches.sort(key=lambda row: row["id"], reverse=True)
+        results.extend(matches[: limit - len(results)])
+        if len(results) >= limit:
+            break
+    return results
@@ -1,37 +1,99 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 
+from . import metrics
 from .config import get_settings
-from .database import SessionLocal
+from .asyncdb import wait_future
+from .database import SessionLocal, after_commit, is_write_request
 from .models import User
+from .sqlitewriter import get_sqlite_writer
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# cambiando BCRYPT_ROUNDS gli hash esistenti vengono aggiornati al login successivo
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=get_settings().bcrypt_rounds)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
-_login_attempts: dict[str, tuple[int, datetime]] = {}
+# user id -> (is_active, token_version, scadenza): evita la query sull'utente a
+# ogni richiesta. Le modifiche fatte in questo processo invalidano subito la
+# voce; gli altri processi la rileggono entro AUTH_CACHE_TTL_SECONDS.
+_user_state_cache: dict[int, tuple[bool, int, float]] = {}
+_user_state_lock = threading.Lock()
 
 
-def get_db():
-    db = SessionLocal()
+def get_db(request: Request):
+    # unit of work per richiesta: un solo commit dopo l'handler (prima dell'invio
+    # della risposta), rollback se l'handler solleva. Gli handler usano flush
+    # quando servono gli id generati. Con SQLITE_WRITER le richieste che scrivono
+    # passano dal writer unico fin dalla prima query (vedi sqlitewriter).
+    writer = get_sqlite_writer()
+    db = writer.session(write=is_write_request(request)) if writer is not None else SessionLocal()
     try:
         yield db
+        if db.in_transaction():
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
 
 
+# bcrypt consuma ~250 ms di CPU: gira su un executor dedicato e limitato, così
+# un picco di login non occupa tutti i thread delle richieste. Oltre
+# PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE operazioni in attesa si risponde 503.
+
+
+@lru_cache
+def _hash_executor() -> tuple[ThreadPoolExecutor, threading.BoundedSemaphore]:
+    settings = get_settings()
+    executor = ThreadPoolExecutor(max_workers=settings.password_hash_workers, thread_name_prefix="bcrypt")
+    return executor, threading.BoundedSemaphore(settings.password_hash_workers + settings.password_hash_queue)
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        metrics.observe("password_hash", time.perf_counter() - started)
+
+
+def _submit_hash(fn, *args) -> Future:
+    executor, slots = _hash_executor()
+    if not slots.acquire(blocking=False):
+        metrics.incr("password_hash.rejected")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server occupato. Riprova tra qualche secondo.",
+            headers={"Retry-After": "1"},
+        )
+    future = executor.submit(_timed, fn, *args)
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+
 def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain, hashed)
+    return wait_future(_submit_hash(pwd_context.verify, plain, hashed))
 
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return wait_future(_submit_hash(pwd_context.hash, password))
+
+
+async def verify_and_update_password(plain: str, hashed: str) -> tuple[bool, str | None]:
+    # restituisce anche il nuovo hash se i parametri di CryptContext sono cambiati
+    return await asyncio.wrap_future(_submit_hash(pwd_context.verify_and_update, plain, hashed))
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -42,6 +104,39 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return jwt.encode(to_encode, settings.secret_key, algorithm="HS256")
 
 
+def create_user_token(user: User) -> str:
+    return create_access_token({"sub": user.username, "uid": user.id, "role": user.role, "tv": user.token_version or 0})
+
+
+def _user_state(db: Session, user_id: int) -> tuple[bool, int] | None:
+    now = time.monotonic()
+    with _user_state_lock:
+        cached = _user_state_cache.get(user_id)
+    if cached and cached[2] > now:
+        return cached[0], cached[1]
+    row = db.query(User.is_active, User.token_version).filter(User.id == user_id).first()
+    if row is None:
+        return None
+    with _user_state_lock:
+        _user_state_cache[user_id] = (row.is_active, row.token_version or 0, now + get_settings().auth_cache_ttl_seconds)
+    return row.is_active, row.token_version or 0
+
+
+def invalidate_user_state(user_id: int) -> None:
+    with _user_state_lock:
+        _user_state_cache.pop(user_id, None)
+
+
+def invalidate_user_state_on_commit(db: Session, user_id: int) -> None:
+    # dopo il commit: prima, un'altra richiesta potrebbe rimettere in cache lo stato vecchio
+    after_commit(db, lambda: invalidate_user_state(user_id))
+
+
+def revoke_user_tokens(db: Session, user: User) -> None:
+    user.token_version = (user.token_version or 0) + 1
+    invalidate_user_state_on_commit(db, user.id)
+
+
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
     settings = get_settings()
     credentials_exception = HTTPException(
@@ -56,10 +151,28 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             raise credentials_exception
     except JWTError as exc:
         raise credentials_exception from exc
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not user.is_active:
+
+    user_id = payload.get("uid")
+    if user_id is None:
+        # token emessi prima dell'introduzione di uid/tv
+        user = db.query(User).filter(User.username == username).first()
+        if not user or not user.is_active:
+            raise credentials_exception
+        return user
+
+    state = _user_state(db, user_id)
+    if state is None or not state[0] or state[1] != payload.get("tv"):
         raise credentials_exception
-    return user
+    # utente transiente costruito dal token: basta per id/ruolo/username.
+    # Le route che leggono altri campi caricano la riga con load_current_user.
+    return User(id=user_id, username=username, role=payload.get("role"), is_active=True, token_version=state[1])
+
+
+def load_current_user(db: Session, user: User) -> User:
+    current = db.get(User, user.id)
+    if current is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenziali non valide.")
+    return current
 
 
 def require_admin(user: User = Depends(get_current_user)) -> User:
@@ -67,17 +180,3 @@ def require_admin(user: User = Depends(get_current_user)) -> User:
         raise HTTPException(status_code=403, detail="Permessi amministratore richiesti.")
     return user
 
-
-def rate_limit_login(username: str) -> None:
-    now = datetime.utcnow()
-    attempts, last_time = _login_attempts.get(username, (0, now))
-    if (now - last_time).total_seconds() > 300:
-        attempts = 0
-    attempts += 1
-    _login_attempts[username] = (attempts, now)
-    if attempts > 5:
-        raise HTTPException(status_code=429, detail="Troppi tentativi. Riprova tra pochi minuti.")
-
-
-def reset_rate_limit(username: str) -> None:
-    _login_attempts.pop(username, None)
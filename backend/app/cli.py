@@ -0,0 +1,96 @@
+"""Comandi di manutenzione.
+
+Uso (dalla cartella backend):
+    python -m app.cli backfill-area-scores
+    python -m app.cli repair-latest-assessments
+    python -m app.cli archive-audit [--retention-months N]
+    python -m app.cli build-static
+"""
+
+import argparse
+
+from .auditarchive import archive_audit, ensure_partitions
+from .config import get_settings
+from .database import SessionLocal
+from .materialized import rebuild_area_scores, repair_latest_assessments
+from .models import Assessment
+from .staticassets import build_static
+
+
+def backfill_area_scores(batch_size: int = 200) -> int:
+    db = SessionLocal()
+    try:
+        done = 0
+        last_id = 0
+        while True:
+            batch = (
+                db.query(Assessment)
+                .filter(Assessment.id > last_id)
+                .order_by(Assessment.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not batch:
+                break
+            for assessment in batch:
+                rebuild_area_scores(db, assessment)
+            db.commit()
+            done += len(batch)
+            last_id = batch[-1].id
+            db.expunge_all()
+        return done
+    finally:
+        db.close()
+
+
+def repair_latest() -> list[int]:
+    db = SessionLocal()
+    try:
+        drifted = repair_latest_assessments(db)
+        db.commit()
+        return drifted
+    finally:
+        db.close()
+
+
+def run_audit_retention(retention_months: int) -> tuple[list[str], dict[str, int]]:
+    db = SessionLocal()
+    try:
+        created = ensure_partitions(db)
+        db.commit()
+        return created, archive_audit(db, get_settings().audit_archive_dir, retention_months)
+    finally:
+        db.close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("backfill-area-scores", help="Ricalcola assessment_area_scores da tutte le risposte.")
+    commands.add_parser("repair-latest-assessments", help="Riallinea profiles.latest_assessment_id.")
+    archive = commands.add_parser("archive-audit", help="Sposta i mesi di audit oltre la retention in archivi JSONL compressi.")
+    archive.add_argument("--retention-months", type=int, default=get_settings().audit_retention_months)
+    commands.add_parser("build-static", help="Prepara static_dist: asset con hash nel nome e varianti .br/.gz.")
+
+    args = parser.parse_args(argv)
+    if args.command == "backfill-area-scores":
+        print(f"Aggregati ricalcolati per {backfill_area_scores()} assessment.")
+    elif args.command == "repair-latest-assessments":
+        drifted = repair_latest()
+        print(f"Profili corretti: {len(drifted)}" + (f" ({', '.join(map(str, drifted))})" if drifted else ""))
+    elif args.command == "archive-audit":
+        created, archived = run_audit_retention(args.retention_months)
+        for name in created:
+            print(f"Creata partizione {name}.")
+        for month, count in archived.items():
+            print(f"Archiviate {count} voci di {month}.")
+        if not archived:
+            print("Nessun mese da archiviare.")
+    elif args.command == "build-static":
+        manifest = build_static()
+        for original, hashed in manifest.items():
+            print(f"{original} -> {hashed}")
+
+
+if __name__ == "__main__":
+    main()
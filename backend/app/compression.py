@@ -0,0 +1,130 @@
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # opzionale: senza brotli solo gzip
+    brotli = None
+
+
+# Compressione delle risposte API testuali (JSON, CSV, NDJSON) sopra una soglia.
+# Gli asset statici non passano da qui: usano le varianti .br/.gz generate in
+# fase di build (vedi staticassets).
+
+COMPRESSIBLE_TYPES = {"application/json", "text/csv", "application/x-ndjson"}
+
+
+def accepted_encodings(header: str) -> set[str]:
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+class _GzipStream:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        # flush a ogni blocco: il client riceve i dati degli export in streaming senza attese
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class _BrotliStream:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and "br" in accepted:
+            encoding = "br"
+        elif "gzip" in accepted:
+            encoding = "gzip"
+        else:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSend(self, send, encoding))
+
+
+class _CompressingSend:
+    def __init__(self, middleware: CompressionMiddleware, send, encoding: str):
+        self.middleware = middleware
+        self.send = send
+        self.encoding = encoding
+        self.start = None
+        self.stream = None
+
+    async def __call__(self, message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if self.start is not None:
+            start, self.start = self.start, None
+            if message["type"] != "http.response.body" or not self._begin(start, message):
+                await self.send(start)
+                await self.send(message)
+                return
+            if not message.get("more_body", False):
+                body = self.stream.finish(message.get("body", b""))
+                MutableHeaders(raw=start["headers"])["Content-Length"] = str(len(body))
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            await self.send(start)
+        if self.stream is None or message["type"] != "http.response.body":
+            await self.send(message)
+            return
+        more_body = message.get("more_body", False)
+        body = message.get("body", b"")
+        body = self.stream.chunk(body) if more_body else self.stream.finish(body)
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    def _begin(self, start, message) -> bool:
+        # decide sul primo blocco: tipo, codifica già presente e dimensione
+        headers = MutableHeaders(raw=start["headers"])
+        media_type = headers.get("content-type", "").split(";")[0].strip()
+        if media_type not in COMPRESSIBLE_TYPES or "content-encoding" in headers:
+            return False
+        headers.add_vary_header("Accept-Encoding")
+        if not message.get("more_body", False) and len(message.get("body", b"")) < self.middleware.minimum_size:
+            return False
+        middleware = self.middleware
+        self.stream = _BrotliStream(middleware.brotli_quality) if self.encoding == "br" else _GzipStream(middleware.gzip_level)
+        headers["Content-Encoding"] = self.encoding
+        if "content-length" in headers:
+            del headers["content-length"]
+        # rappresentazione diversa dall'originale: un ETag forte diventa debole
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+        return True
@@ -8,10 +8,74 @@ class Settings(BaseSettings):
     database_url: str = Field("sqlite:///./edufad.db", env="DATABASE_URL")
     secret_key: str = Field("change-me", env="SECRET_KEY")
     access_token_expire_minutes: int = Field(60 * 8, env="ACCESS_TOKEN_EXPIRE_MINUTES")
+    # cache per processo di is_active/token_version (vedi auth): con più worker una
+    # disattivazione o revoca dei token vale negli altri processi entro questo tempo
+    auth_cache_ttl_seconds: float = Field(30.0, env="AUTH_CACHE_TTL_SECONDS")
+    bcrypt_rounds: int = Field(12, env="BCRYPT_ROUNDS")
+    password_hash_workers: int = Field(2, env="PASSWORD_HASH_WORKERS")
+    password_hash_queue: int = Field(32, env="PASSWORD_HASH_QUEUE")
+
+    # rate limit login: "memory" (per processo) o "database" (condiviso tra worker,
+    # su RATE_LIMIT_DATABASE_URL se impostato, altrimenti sul DB applicativo)
+    rate_limit_backend: str = Field("memory", env="RATE_LIMIT_BACKEND")
+    rate_limit_database_url: str | None = Field(None, env="RATE_LIMIT_DATABASE_URL")
+    rate_limit_memory_max_keys: int = Field(10000, env="RATE_LIMIT_MEMORY_MAX_KEYS")
+    login_window_seconds: int = Field(300, env="LOGIN_WINDOW_SECONDS")
+    login_max_attempts_per_user: int = Field(5, env="LOGIN_MAX_ATTEMPTS_PER_USER")
+    login_max_attempts_per_ip: int = Field(100, env="LOGIN_MAX_ATTEMPTS_PER_IP")
+    # proxy fidati (stessa variabile di uvicorn, "*" = qualsiasi): da questi si legge
+    # l'IP del client in X-Forwarded-For (es. Render: FORWARDED_ALLOW_IPS=*)
+    forwarded_allow_ips: str = Field("127.0.0.1", env="FORWARDED_ALLOW_IPS")
+
+    # pool di connessioni (PostgreSQL): pre-ping e recycle evitano connessioni
+    # chiuse lato server dopo l'idle timeout di Render
+    db_pool_size: int = Field(5, env="DB_POOL_SIZE")
+    db_max_overflow: int = Field(10, env="DB_MAX_OVERFLOW")
+    db_pool_timeout: float = Field(30.0, env="DB_POOL_TIMEOUT")
+    db_pool_recycle: int = Field(1800, env="DB_POOL_RECYCLE")
+    db_pool_pre_ping: bool = Field(True, env="DB_POOL_PRE_PING")
+    # replica in sola lettura per dashboard ed export (vedi replica)
+    read_database_url: str | None = Field(None, env="READ_DATABASE_URL")
+    read_your_writes_seconds: float = Field(5.0, env="READ_YOUR_WRITES_SECONDS")
+    # SQLite: WAL permette letture concorrenti a una scrittura, busy_timeout
+    # attende il lock invece di fallire con "database is locked"
+    sqlite_journal_mode: str = Field("wal", env="SQLITE_JOURNAL_MODE")
+    sqlite_synchronous: str = Field("normal", env="SQLITE_SYNCHRONOUS")
+    sqlite_busy_timeout_ms: int = Field(5000, env="SQLITE_BUSY_TIMEOUT_MS")
+    sqlite_cache_size_kb: int = Field(20000, env="SQLITE_CACHE_SIZE_KB")
+    sqlite_mmap_size_mb: int = Field(128, env="SQLITE_MMAP_SIZE_MB")
+    # scritture SQLite serializzate su una connessione con commit di gruppo (vedi sqlitewriter)
+    sqlite_writer: bool = Field(False, env="SQLITE_WRITER")
+    sqlite_writer_max_queue: int = Field(64, env="SQLITE_WRITER_MAX_QUEUE")
+    sqlite_writer_group_size: int = Field(50, env="SQLITE_WRITER_GROUP_SIZE")
+    sqlite_writer_max_delay_ms: int = Field(20, env="SQLITE_WRITER_MAX_DELAY_MS")
+    # compressione delle risposte JSON/CSV (brotli se installato, altrimenti gzip)
+    compression_min_bytes: int = Field(1024, env="COMPRESSION_MIN_BYTES")
+    compression_gzip_level: int = Field(6, env="COMPRESSION_GZIP_LEVEL")
+    compression_brotli_quality: int = Field(5, env="COMPRESSION_BROTLI_QUALITY")
+
     admin_username: str = Field("admin", env="ADMIN_USERNAME")
     admin_password: str = Field("admin123", env="ADMIN_PASSWORD")
     timezone: str = Field("Europe/Rome", env="TZ")
 
+    # audit: "buffered" (scrittura in batch da un thread) o "sync" (commit immediato)
+    audit_mode: str = Field("buffered", env="AUDIT_MODE")
+    audit_batch_size: int = Field(200, env="AUDIT_BATCH_SIZE")
+    audit_flush_seconds: float = Field(1.0, env="AUDIT_FLUSH_SECONDS")
+    audit_max_pending: int = Field(5000, env="AUDIT_MAX_PENDING")
+    audit_retention_months: int = Field(12, env="AUDIT_RETENTION_MONTHS")
+    audit_archive_dir: str = Field("./artifacts/audit-archive", env="AUDIT_ARCHIVE_DIR")
+
+    # job in background (python -m app.worker)
+    jobs_concurrency: int = Field(2, env="JOBS_CONCURRENCY")
+    jobs_max_attempts: int = Field(3, env="JOBS_MAX_ATTEMPTS")
+    jobs_max_queue: int = Field(500, env="JOBS_MAX_QUEUE")
+    jobs_poll_seconds: float = Field(1.0, env="JOBS_POLL_SECONDS")
+    jobs_artifact_dir: str = Field("./artifacts", env="JOBS_ARTIFACT_DIR")
+    pdf_cache_dir: str = Field("./artifacts/pdf-cache", env="PDF_CACHE_DIR")
+    pdf_cache_max_mb: int = Field(256, env="PDF_CACHE_MAX_MB")
+    render_workers: int = Field(2, env="RENDER_WORKERS")
+
 
 @lru_cache
 def get_settings() -> Settings:
@@ -1,20 +1,156 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+import logging
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
 
 from .config import get_settings
 
 
+logger = logging.getLogger("edufad.db")
+
+
 class Base(DeclarativeBase):
     pass
 
 
-def get_engine():
+class AppSession(Session):
+    # usata sia da SessionLocal sia, in modalità async, da AsyncSession (vedi asyncdb)
+    pass
+
+
+# driver async -> driver sync equivalente, usato da Alembic, CLI, worker ed export
+ASYNC_DRIVERS = {"postgresql+asyncpg": "postgresql", "sqlite+aiosqlite": "sqlite"}
+
+
+def sync_database_url(url: str) -> str:
+    scheme, separator, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + separator + rest
+
+
+def is_async_url(url: str) -> bool:
+    return url.partition("://")[0] in ASYNC_DRIVERS
+
+
+def is_memory_sqlite(url: str) -> bool:
+    return url.startswith("sqlite") and (url.endswith(":memory:") or url.partition("://")[2] in ("", "/"))
+
+
+def engine_options(url: str) -> dict:
+    # opzioni di create_engine/create_async_engine per il dialetto di url
+    settings = get_settings()
+    if url.startswith("sqlite"):
+        if is_memory_sqlite(url):
+            return {}
+        return {"pool_size": settings.db_pool_size, "max_overflow": settings.db_max_overflow, "pool_timeout": settings.db_pool_timeout}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+def sqlite_pragmas() -> dict[str, str]:
     settings = get_settings()
+    return {
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        "busy_timeout": str(settings.sqlite_busy_timeout_ms),
+        # negativo = dimensione in KiB invece che in pagine
+        "cache_size": str(-settings.sqlite_cache_size_kb),
+        "mmap_size": str(settings.sqlite_mmap_size_mb * 1024 * 1024),
+    }
+
+
+def configure_sqlite(sync_engine) -> None:
+    # pragma applicati a ogni nuova connessione del pool
+    pragmas = sqlite_pragmas()
+    if is_memory_sqlite(str(sync_engine.url)):
+        pragmas.pop("journal_mode")
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def get_engine(url: str | None = None):
+    url = sync_database_url(url or get_settings().database_url)
     connect_args = {}
-    if settings.database_url.startswith("sqlite"):
+    if url.startswith("sqlite"):
         connect_args = {"check_same_thread": False}
-    return create_engine(settings.database_url, connect_args=connect_args, future=True)
+    engine = create_engine(url, connect_args=connect_args, future=True, **engine_options(url))
+    if url.startswith("sqlite"):
+        configure_sqlite(engine)
+    return engine
+
+
+def describe_engine(engine) -> dict:
+    # configurazione effettiva: per SQLite i pragma sono letti dalla connessione
+    pool = engine.pool
+    config = {"dialect": engine.dialect.name, "pool": type(pool).__name__}
+    if hasattr(pool, "size"):
+        config.update(pool_size=pool.size(), max_overflow=pool._max_overflow, pool_timeout=pool._timeout)
+    config.update(pool_recycle=pool._recycle, pool_pre_ping=pool._pre_ping)
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as conn:
+            for name in sqlite_pragmas():
+                config[name] = conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+    return config
+
 
+def log_engine_config(engine) -> dict:
+    config = describe_engine(engine)
+    logger.info("Database: %s", ", ".join(f"{key}={value}" for key, value in config.items()))
+    return config
 
+
+ASYNC_MODE = is_async_url(get_settings().database_url)
 engine = get_engine()
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+SessionLocal = sessionmaker(bind=engine, class_=AppSession, autoflush=False, autocommit=False, future=True)
+
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def read_mostly(endpoint):
+    # POST che leggono (es. export ZIP) o scrivono solo alla fine (login): non
+    # prendono il writer SQLite dall'inizio e non contano come scritture per la
+    # replica (vedi is_write_request)
+    endpoint.read_mostly = True
+    return endpoint
+
+
+def is_write_request(request) -> bool:
+    if request.method in SAFE_METHODS:
+        return False
+    route = request.scope.get("route")
+    return not getattr(getattr(route, "endpoint", None), "read_mostly", False)
+
+
+def after_commit(db, callback) -> None:
+    # esegue callback solo se la transazione corrente va a buon fine
+    db.info.setdefault("after_commit", []).append(callback)
+
+
+def run_callbacks(callbacks) -> None:
+    # la transazione è già confermata: un callback che fallisce viene registrato
+    # nel log, senza trasformare la richiesta in un errore né saltare i successivi
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception:
+            logger.exception("Callback after_commit non riuscito.")
+
+
+@event.listens_for(AppSession, "after_commit")
+def _run_after_commit(session):
+    run_callbacks(session.info.pop("after_commit", []))
+
+
+@event.listens_for(AppSession, "after_rollback")
+def _discard_after_commit(session):
+    session.info.pop("after_commit", None)
@@ -0,0 +1,90 @@
+import json
+from collections import namedtuple
+from functools import lru_cache
+from typing import Any
+
+from fastapi import HTTPException, Response
+from pydantic import BaseModel, TypeAdapter
+from typing_extensions import TypedDict
+
+try:
+    import orjson
+except ImportError:  # opzionale: senza orjson si usa il TypeAdapter
+    orjson = None
+
+
+# Percorso veloce per le liste lunghe: invece di caricare istanze ORM e farle
+# validare a Pydantic (from_attributes) si selezionano solo le colonne dello
+# schema *Out come tuple e si codificano direttamente in JSON. Il risultato è
+# identico a quello di response_model (vedi benchmarks/serialize_lists.py).
+
+
+class RowSerializer:
+    def __init__(self, schema: type[BaseModel], model, fields=None, json_fields=(), **sources):
+        # fields: sottoinsieme dei campi dello schema (vedi project); json_fields: colonne
+        # Text che contengono JSON; sources: campo dello schema -> colonna, se il nome non coincide
+        self.schema = schema
+        self.model = model
+        self.sources = sources
+        self.json_fields = tuple(json_fields)
+        self.fields = list(fields or schema.model_fields)
+        self.columns = [sources.get(name, getattr(model, name, None)) for name in self.fields]
+        missing = [name for name, column in zip(self.fields, self.columns) if column is None]
+        if missing:
+            raise ValueError(f"{schema.__name__}: colonne mancanti per {missing}")
+        self.columns = [column.label(name) for name, column in zip(self.fields, self.columns)]
+        # TypedDict con gli stessi tipi dello schema: serializza senza validare
+        annotations = {name: schema.model_fields[name].annotation for name in self.fields}
+        self._adapter = TypeAdapter(list[TypedDict(f"{schema.__name__}Row", annotations)])
+        # per righe che non vengono dal DB (es. archivio audit), accessibili come le Row
+        self._tuple = namedtuple(f"{schema.__name__}Tuple", self.fields)
+        self._decode = [name in self.json_fields for name in self.fields]
+
+    def row(self, record: dict[str, Any]):
+        return self._tuple(*(record.get(name) for name in self.fields))
+
+    def project(self, fields) -> "RowSerializer":
+        return _project(self, tuple(fields))
+
+    def fieldset(self, value: str | None, summary) -> "RowSerializer":
+        # fields=: assente o "summary" -> proiezione di riepilogo, "all" -> tutti i
+        # campi, altrimenti elenco separato da virgole. L'id è sempre incluso.
+        if value is None or value == "summary":
+            names = list(summary)
+        elif value == "all":
+            names = self.fields
+        else:
+            names = [name.strip() for name in value.split(",") if name.strip()]
+            unknown = sorted(set(names) - set(self.fields))
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Campi non validi: {', '.join(unknown)}.")
+        return self.project(dict.fromkeys(["id", *names]))
+
+    def query(self, db, *extra):
+        # extra: colonne necessarie alla query (es. chiavi del cursore) ma non restituite
+        labels = set(self.fields)
+        return db.query(*self.columns, *(column for column in extra if column.key not in labels))
+
+    def dumps(self, rows: list) -> bytes:
+        if any(self._decode):
+            rows = [
+                [json.loads(value) if decode and isinstance(value, str) else value for value, decode in zip(row, self._decode)]
+                for row in rows
+            ]
+        records = [dict(zip(self.fields, row)) for row in rows]
+        if orjson is not None:
+            return orjson.dumps(records, option=orjson.OPT_UTC_Z)
+        return self._adapter.dump_json(records)
+
+    def response(self, rows: list, response: Response | None = None) -> Response:
+        # gli header impostati sul Response iniettato (cursore, ETag) vanno copiati:
+        # FastAPI non li unisce quando l'handler restituisce un Response
+        headers = dict(response.headers) if response is not None else None
+        return Response(self.dumps(rows), media_type="application/json", headers=headers)
+
+
+@lru_cache(maxsize=64)
+def _project(serializer: RowSerializer, fields: tuple[str, ...]) -> RowSerializer:
+    if list(fields) == serializer.fields:
+        return serializer
+    return RowSerializer(serializer.schema, serializer.model, fields, serializer.json_fields, **serializer.sources)
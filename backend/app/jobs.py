@@ -0,0 +1,157 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from . import reports
+from .audit import log_action
+from .config import get_settings
+from .database import SessionLocal
+from .models import Job, User
+
+
+# Coda job su DB: le route inseriscono i job, il worker (python -m app.worker)
+# li prende in carico e salva il PDF prodotto in JOBS_ARTIFACT_DIR.
+
+JOB_KINDS = {
+    "assessment_pdf": ("assessment_id",),
+    "item_pdf": ("item_id",),
+    "plan_pdf": ("plan_id",),
+}
+ACTIVE_STATUSES = ("queued", "running")
+STALE_AFTER = timedelta(minutes=30)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def submit_job(db: Session, kind: str, params: dict, user_id: int) -> Job:
+    settings = get_settings()
+    missing = [key for key in JOB_KINDS[kind] if key not in params]
+    if missing:
+        raise ValueError(f"Parametri mancanti: {', '.join(missing)}.")
+    pending = db.query(func.count(Job.id)).filter(Job.status.in_(ACTIVE_STATUSES)).scalar()
+    if pending >= settings.jobs_max_queue:
+        raise JobQueueFull("Coda job piena. Riprova più tardi.")
+
+    job = Job(
+        kind=kind,
+        params={key: params[key] for key in JOB_KINDS[kind]},
+        status="queued",
+        attempts=0,
+        max_attempts=settings.jobs_max_attempts,
+        created_by_id=user_id,
+    )
+    db.add(job)
+    db.flush()
+    return job
+
+
+def render_job(db: Session, job: Job) -> tuple[bytes, str]:
+    params = job.params
+    if job.kind == "assessment_pdf":
+        return reports.assessment_pdf(db, params["assessment_id"]), f"assessment_{params['assessment_id']}.pdf"
+    if job.kind == "item_pdf":
+        user = db.get(User, job.created_by_id)
+        return reports.item_pdf(db, params["item_id"], user.username if user else "-"), f"item_{params['item_id']}.pdf"
+    if job.kind == "plan_pdf":
+        return reports.plan_pdf(db, params["plan_id"]), f"plan_{params['plan_id']}.pdf"
+    raise ValueError(f"Tipo job sconosciuto: {job.kind}")
+
+
+def claim_next_job(db: Session) -> int | None:
+    # presa in carico ottimistica: vince chi aggiorna la riga ancora "queued"
+    now = datetime.utcnow()
+    candidates = (
+        db.query(Job.id)
+        .filter(
+            Job.status == "queued",
+            Job.attempts < Job.max_attempts,
+            or_(Job.run_after.is_(None), Job.run_after <= now),
+        )
+        .order_by(Job.id)
+        .limit(5)
+        .all()
+    )
+    for (job_id,) in candidates:
+        claimed = (
+            db.query(Job)
+            .filter(Job.id == job_id, Job.status == "queued")
+            .update({Job.status: "running", Job.attempts: Job.attempts + 1, Job.started_at: now}, synchronize_session=False)
+        )
+        db.commit()
+        if claimed:
+            return job_id
+    return None
+
+
+def requeue_stale_jobs(db: Session) -> int:
+    # job rimasti "running" dopo un crash del worker. Chi ha esaurito i tentativi
+    # fallisce: un job che fa cadere il worker (es. memoria esaurita nel render)
+    # non va ripreso a ogni riavvio. Chiamata a ogni giro del worker: la SELECT
+    # evita di prendere il lock di scrittura quando non c'è nulla da fare.
+    now = datetime.utcnow()
+    stale = db.query(Job).filter(Job.status == "running", Job.started_at < now - STALE_AFTER)
+    if not db.query(stale.exists()).scalar():
+        db.rollback()
+        return 0
+    stale.filter(Job.attempts >= Job.max_attempts).update(
+        {Job.status: "failed", Job.error: "Worker interrotto durante l'esecuzione.", Job.finished_at: now},
+        synchronize_session=False,
+    )
+    requeued = stale.filter(Job.attempts < Job.max_attempts).update({Job.status: "queued"}, synchronize_session=False)
+    db.commit()
+    return requeued
+
+
+def _retry_or_fail(job: Job, error: str, retry: bool = True) -> None:
+    job.error = error
+    if retry and job.attempts < job.max_attempts:
+        job.status = "queued"
+        job.run_after = datetime.utcnow() + timedelta(seconds=5 * 2 ** job.attempts)
+    else:
+        job.status = "failed"
+        job.finished_at = datetime.utcnow()
+
+
+def release_job(db: Session, job_id: int, error: str) -> str:
+    # job preso in carico ma rimasto senza esito (processo del pool terminato)
+    job = db.get(Job, job_id)
+    _retry_or_fail(job, error)
+    db.commit()
+    return job.status
+
+
+def run_job(job_id: int) -> str:
+    settings = get_settings()
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        try:
+            content, filename = render_job(db, job)
+        except Exception as exc:
+            db.rollback()
+            job = db.get(Job, job_id)
+            _retry_or_fail(job, f"{type(exc).__name__}: {exc}", retry=not isinstance(exc, reports.ReportNotFound))
+            db.commit()
+            return job.status
+
+        directory = Path(settings.jobs_artifact_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"job_{job.id}_{filename}"
+        path.write_bytes(content)
+
+        job.status = "done"
+        job.error = None
+        job.artifact_path = str(path)
+        job.artifact_name = filename
+        job.finished_at = datetime.utcnow()
+        entity_id = next((value for value in job.params.values() if isinstance(value, int)), None)
+        # sync: i processi del pool terminano senza svuotare un eventuale buffer
+        log_action(db, job.created_by_id, "export", job.kind, entity_id, f"Export {job.kind} (job {job.id}).", mode="sync")
+        db.commit()
+        return job.status
+    finally:
+        db.close()
@@ -1,35 +1,59 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta
+from concurrent.futures import as_completed
+from datetime import date, datetime, timedelta, timezone
 import csv
+import hashlib
 import io
+import json
 from pathlib import Path
+import re
+import zipfile
 
-from fastapi import Depends, FastAPI, HTTPException, Query, Response, status
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.staticfiles import StaticFiles
-from sqlalchemy import and_, func
+from sqlalchemy import func, or_
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 
-from .audit import log_action
+from . import metrics, reports
+from .asyncdb import install_async_mode, run_db
+from .audit import flush_audit, log_action, shutdown_audit
+from .auditarchive import search_archive
 from .auth import (
-    create_access_token,
+    create_user_token,
     get_current_user,
     get_db,
     hash_password,
-    rate_limit_login,
-    reset_rate_limit,
+    invalidate_user_state_on_commit,
+    load_current_user,
     require_admin,
-    verify_password,
+    revoke_user_tokens,
+    verify_and_update_password,
 )
 from .checklist import CHECKLIST
+from .compression import CompressionMiddleware
 from .config import get_settings
-from .database import Base, engine
+from .database import Base, SessionLocal, engine, is_write_request, log_engine_config, read_mostly
+from .fastjson import RowSerializer
+from .jobs import JobQueueFull, submit_job
+from .materialized import (
+    check_area_scores,
+    load_area_stats,
+    lock_assessment,
+    refresh_area_scores,
+    refresh_latest_assessment,
+    sync_assessment_scores,
+)
 from .models import (
     Assessment,
+    AssessmentAreaScore,
     AuditLog,
     GroupAssignee,
     GroupMember,
+    Job,
     Plan,
     Profile,
     Response as ResponseModel,
@@ -37,15 +61,25 @@ from .models import (
     User,
     WorkGroup,
 )
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor, paginate, set_next_cursor
+from .pdfcache import get_pdf_cache
+from .ratelimit import client_ip, rate_limit_login, record_failed_login, reset_rate_limit
+from .replica import ReadSessionLocal, get_read_db, mark_write, read_session_factory
+from .reports import item_results_query
 from .schemas import (
     AssessmentCreate,
+    AssessmentStatus,
     AssessmentOut,
     AssessmentUpdate,
     AuditOut,
+    JobCreate,
+    JobOut,
     PlanOut,
     ProfileCreate,
     ProfileOut,
     ProfileUpdate,
+    ReportsZipRequest,
+    ResponseBulk,
     ResponseCreate,
     ResponseOut,
     SummaryOut,
@@ -58,9 +92,33 @@ from .schemas import (
     WorkGroupOut,
     WorkGroupUpdate,
 )
-from .services import ITEM_TO_AREA, build_plan_content, summarize_assessment
+from .services import ITEM_TO_AREA, build_plan_content, render_summary
+from .staticassets import STATIC_BUILD_DIR, STATIC_SOURCE_DIR, PrecompressedStaticFiles
+from .versions import conditional_get, ensure_versions
 
 app = FastAPI(title="EduFAD")
+# DATABASE_URL con driver async: AsyncSession per gli handler async (vedi asyncdb)
+install_async_mode(app, get_db, get_current_user)
+
+
+async def read_your_writes(request: Request, call_next):
+    response = await call_next(request)
+    # le POST @read_mostly (login, export ZIP) non spostano le letture sul primario
+    if is_write_request(request) and response.status_code < 400:
+        mark_write(response)
+    return response
+
+
+if ReadSessionLocal is not None:
+    app.middleware("http")(read_your_writes)
+
+# registrato per ultimo: è il più esterno e comprime anche gli errori JSON
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=get_settings().compression_min_bytes,
+    gzip_level=get_settings().compression_gzip_level,
+    brotli_quality=get_settings().compression_brotli_quality,
+)
 
 
 # =========================
@@ -78,8 +136,9 @@ def health():
 def startup():
     Base.metadata.create_all(bind=engine)
     settings = get_settings()
+    log_engine_config(engine)
 
-    db = next(get_db())
+    db = SessionLocal()
     try:
         existing = db.query(User).filter(User.username == settings.admin_username).first()
         if not existing:
@@ -90,41 +149,63 @@ def startup():
                 is_active=True,
             )
             db.add(admin)
-            db.commit()
+            db.flush()
             log_action(db, None, "seed_admin", "user", admin.id, "Creato utente admin iniziale.")
+        ensure_versions(db)
+        db.commit()
     finally:
         db.close()
 
 
+@app.on_event("shutdown")
+def shutdown():
+    reports.shutdown_render_pool()
+    shutdown_audit()
+
+
 # =========================
 # Auth
 # =========================
-@app.post("/api/auth/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    rate_limit_login(form_data.username)
+def _complete_login(db: Session, user: User, new_hash: str | None) -> str:
+    if new_hash:
+        # parametri bcrypt cambiati: aggiorna l'hash ora che la password è nota
+        user.password_hash = new_hash
+    log_action(db, user.id, "login", "user", user.id, "Accesso utente.")
+    return create_user_token(user)
+
 
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password_hash):
+@app.post("/api/auth/login", response_model=Token)
+@read_mostly
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    # async: l'attesa di bcrypt non occupa un thread; il DB passa da run_db
+    ip = client_ip(request)
+    await run_in_threadpool(rate_limit_login, form_data.username, ip)
+
+    user = await run_db(lambda: db.query(User).filter(User.username == form_data.username).first())
+    valid, new_hash = (False, None)
+    if user:
+        valid, new_hash = await verify_and_update_password(form_data.password, user.password_hash)
+    if not valid:
+        await run_in_threadpool(record_failed_login, ip)
         raise HTTPException(status_code=401, detail="Credenziali errate.")
     if not user.is_active:
         raise HTTPException(status_code=403, detail="Utente disattivato.")
 
-    reset_rate_limit(form_data.username)
+    await run_in_threadpool(reset_rate_limit, form_data.username)
 
-    access_token = create_access_token({"sub": user.username, "role": user.role})
-    log_action(db, user.id, "login", "user", user.id, "Accesso utente.")
+    access_token = await run_db(_complete_login, db, user, new_hash)
     return Token(access_token=access_token)
 
 
 @app.get("/api/auth/me", response_model=UserOut)
-def read_me(user: User = Depends(get_current_user)):
-    return user
+def read_me(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    return load_current_user(db, user)
 
 
 @app.post("/api/auth/ack-disclaimer", response_model=UserOut)
 def acknowledge_disclaimer(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    user = load_current_user(db, user)
     user.disclaimer_ack_at = datetime.utcnow()
-    db.commit()
     log_action(db, user.id, "acknowledge", "disclaimer", user.id, "Conferma disclaimer.")
     return user
 
@@ -143,14 +224,25 @@ def create_user(payload: UserCreate, db: Session = Depends(get_db), actor: User
         is_active=True,
     )
     db.add(new_user)
-    db.commit()
+    db.flush()
     log_action(db, actor.id, "create", "user", new_user.id, f"Creato utente {payload.username}.")
     return new_user
 
 
 @app.get("/api/users", response_model=list[UserOut], dependencies=[Depends(require_admin)])
-def list_users(db: Session = Depends(get_db)):
-    return db.query(User).order_by(User.username).all()
+def list_users(
+    response: Response,
+    role: str | None = None,
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+):
+    query = db.query(User)
+    if role:
+        query = query.filter(User.role == role)
+    users, next_cursor = paginate(query, [(User.username, False)], cursor, limit)
+    set_next_cursor(response, next_cursor)
+    return users
 
 
 @app.get("/api/users/basic", response_model=list[UserBasic])
@@ -166,7 +258,9 @@ def update_user(user_id: int, payload: UserCreate, db: Session = Depends(get_db)
     existing.username = payload.username
     existing.role = payload.role
     existing.password_hash = hash_password(payload.password)
-    db.commit()
+    if payload.is_active is not None:
+        existing.is_active = payload.is_active
+    revoke_user_tokens(db, existing)
     log_action(db, actor.id, "update", "user", existing.id, "Aggiornato utente.")
     return existing
 
@@ -177,7 +271,7 @@ def delete_user(user_id: int, db: Session = Depends(get_db), actor: User = Depen
     if not existing:
         raise HTTPException(status_code=404, detail="Utente non trovato.")
     db.delete(existing)
-    db.commit()
+    invalidate_user_state_on_commit(db, user_id)
     log_action(db, actor.id, "delete", "user", user_id, "Eliminato utente.")
     return {"ok": True}
 
@@ -185,9 +279,17 @@ def delete_user(user_id: int, db: Session = Depends(get_db), actor: User = Depen
 # =========================
 # Checklist
 # =========================
+# CHECKLIST è statica: serializzata una volta, ETag forte e cache lunga
+CHECKLIST_BYTES = json.dumps(CHECKLIST, ensure_ascii=False).encode("utf-8")
+CHECKLIST_ETAG = f'"{hashlib.sha256(CHECKLIST_BYTES).hexdigest()[:32]}"'
+
+
 @app.get("/api/checklist")
-def get_checklist():
-    return CHECKLIST
+def get_checklist(request: Request):
+    headers = {"ETag": CHECKLIST_ETAG, "Cache-Control": "public, max-age=86400"}
+    if CHECKLIST_ETAG in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(CHECKLIST_BYTES, media_type="application/json", headers=headers)
 
 
 # =========================
@@ -197,14 +299,26 @@ def get_checklist():
 def create_profile(payload: ProfileCreate, db: Session = Depends(get_db), actor: User = Depends(get_current_user)):
     profile = Profile(**payload.model_dump())
     db.add(profile)
-    db.commit()
+    db.flush()
     log_action(db, actor.id, "create", "profile", profile.id, f"Creato profilo {profile.display_name}.")
     return profile
 
 
 @app.get("/api/profiles", response_model=list[ProfileOut])
-def list_profiles(db: Session = Depends(get_db), _user: User = Depends(get_current_user)):
-    return db.query(Profile).order_by(Profile.display_name).all()
+def list_profiles(
+    request: Request,
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    _user: User = Depends(get_current_user),
+):
+    not_modified = conditional_get(request, response, db, ("profiles",), _user)
+    if not_modified is not None:
+        return not_modified
+    profiles, next_cursor = paginate(db.query(Profile), [(Profile.display_name, False), (Profile.id, False)], cursor, limit)
+    set_next_cursor(response, next_cursor)
+    return profiles
 
 
 @app.patch("/api/profiles/{profile_id}", response_model=ProfileOut, dependencies=[Depends(require_admin)])
@@ -214,7 +328,7 @@ def update_profile(profile_id: int, payload: ProfileUpdate, db: Session = Depend
         raise HTTPException(status_code=404, detail="Profilo non trovato.")
     for field, value in payload.model_dump(exclude_unset=True).items():
         setattr(profile, field, value)
-    db.commit()
+    db.flush()
     log_action(db, actor.id, "update", "profile", profile.id, "Aggiornato profilo.")
     return profile
 
@@ -225,7 +339,6 @@ def delete_profile(profile_id: int, db: Session = Depends(get_db), actor: User =
     if not profile:
         raise HTTPException(status_code=404, detail="Profilo non trovato.")
     db.delete(profile)
-    db.commit()
     log_action(db, actor.id, "delete", "profile", profile_id, "Eliminato profilo.")
     return {"ok": True}
 
@@ -241,27 +354,63 @@ def create_assessment(payload: AssessmentCreate, db: Session = Depends(get_db),
         updated_by_id=user.id,
     )
     db.add(assessment)
-    db.commit()
+    refresh_latest_assessment(db, assessment.profile_id)
     log_action(db, user.id, "create", "assessment", assessment.id, "Creato assessment.")
     return assessment
 
 
+# liste lunghe: colonne come tuple, JSON senza istanze ORM né validazione (vedi fastjson)
+ASSESSMENT_ROWS = RowSerializer(AssessmentOut, Assessment)
+# proiezione di default delle liste: note e presenti solo nel dettaglio o con fields=
+ASSESSMENT_SUMMARY_FIELDS = [
+    name for name in ASSESSMENT_ROWS.fields if name not in ("present_user_ids", "present_other", "session_notes")
+]
+
+
 @app.get("/api/assessments", response_model=list[AssessmentOut])
 def list_assessments(
+    request: Request,
+    response: Response,
     profile_id: int | None = None,
     include_deleted: bool = False,
+    status: AssessmentStatus | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    operator: str | None = None,
+    fields: str | None = None,
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
-    query = db.query(Assessment)
+    not_modified = conditional_get(request, response, db, ("assessments",), user)
+    if not_modified is not None:
+        return not_modified
+    rows = ASSESSMENT_ROWS.fieldset(fields, ASSESSMENT_SUMMARY_FIELDS)
+    query = rows.query(db, Assessment.assessment_date, Assessment.id)
     if profile_id:
         query = query.filter(Assessment.profile_id == profile_id)
+    if status:
+        query = query.filter(Assessment.status == status)
+    if date_from:
+        query = query.filter(Assessment.assessment_date >= date_from)
+    if date_to:
+        query = query.filter(Assessment.assessment_date <= date_to)
+    if operator:
+        query = query.filter(Assessment.operator_name == operator)
 
     # se non admin o include_deleted non richiesto -> solo non cancellati
     if not include_deleted or user.role != "admin":
         query = query.filter(Assessment.is_deleted.is_(False))
 
-    return query.order_by(Assessment.assessment_date.desc()).all()
+    assessments, next_cursor = paginate(
+        query,
+        [(Assessment.assessment_date, True), (Assessment.id, True)],
+        cursor,
+        limit,
+    )
+    set_next_cursor(response, next_cursor)
+    return rows.response(assessments, response)
 
 
 @app.get("/api/assessments/{assessment_id}", response_model=AssessmentOut)
@@ -282,10 +431,13 @@ def update_assessment(
     assessment = db.query(Assessment).filter(Assessment.id == assessment_id).first()
     if not assessment or (assessment.is_deleted and user.role != "admin"):
         raise HTTPException(status_code=404, detail="Assessment non trovato.")
+    previous_profile_id = assessment.profile_id
     for field, value in payload.model_dump(exclude_unset=True).items():
         setattr(assessment, field, value)
     assessment.updated_by_id = user.id
-    db.commit()
+    sync_assessment_scores(db, assessment)
+    refresh_latest_assessment(db, previous_profile_id, assessment.profile_id)
+    db.flush()
     log_action(db, user.id, "update", "assessment", assessment.id, "Aggiornato assessment.")
     return assessment
 
@@ -304,7 +456,8 @@ def soft_delete_assessment(assessment_id: int, db: Session = Depends(get_db), us
     assessment.is_deleted = True
     assessment.deleted_at = datetime.utcnow()
     assessment.deleted_by_id = user.id
-    db.commit()
+    sync_assessment_scores(db, assessment)
+    refresh_latest_assessment(db, assessment.profile_id)
     log_action(db, user.id, "delete", "assessment", assessment.id, "Soft delete assessment.")
     return {"ok": True}
 
@@ -317,7 +470,8 @@ def restore_assessment(assessment_id: int, db: Session = Depends(get_db), actor:
     assessment.is_deleted = False
     assessment.deleted_at = None
     assessment.deleted_by_id = None
-    db.commit()
+    sync_assessment_scores(db, assessment)
+    refresh_latest_assessment(db, assessment.profile_id)
     log_action(db, actor.id, "restore", "assessment", assessment.id, "Ripristino assessment.")
     return {"ok": True}
 
@@ -328,7 +482,7 @@ def hard_delete_assessment(assessment_id: int, db: Session = Depends(get_db), ac
     if not assessment:
         raise HTTPException(status_code=404, detail="Assessment non trovato.")
     db.delete(assessment)
-    db.commit()
+    refresh_latest_assessment(db, assessment.profile_id)
     log_action(db, actor.id, "hard_delete", "assessment", assessment_id, "Eliminazione definitiva.")
     return {"ok": True}
 
@@ -345,9 +499,7 @@ def list_responses(assessment_id: int, db: Session = Depends(get_db), user: User
 
 
 def _refresh_summary(db: Session, assessment: Assessment, user_id: int):
-    responses = db.query(ResponseModel).filter(ResponseModel.assessment_id == assessment.id).all()
-    response_dicts = [{"item_id": r.item_id, "support": r.support} for r in responses]
-    new_auto = summarize_assessment(response_dicts)
+    new_auto = render_summary(load_area_stats(db, assessment.id))
 
     if assessment.summary:
         prev = assessment.summary.auto_text
@@ -359,7 +511,13 @@ def _refresh_summary(db: Session, assessment: Assessment, user_id: int):
         summary = Summary(assessment_id=assessment.id, auto_text=new_auto)
         db.add(summary)
 
-    db.commit()
+    db.flush()
+
+
+def _check_item_ids(item_ids) -> None:
+    unknown = sorted(set(item_ids) - ITEM_TO_AREA.keys())
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Item non presenti nella checklist: {', '.join(unknown)}.")
 
 
 @app.post("/api/assessments/{assessment_id}/responses", response_model=ResponseOut)
@@ -369,32 +527,79 @@ def upsert_response(
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
-    assessment = db.query(Assessment).filter(Assessment.id == assessment_id, Assessment.is_deleted.is_(False)).first()
+    _check_item_ids([payload.item_id])
+    assessment = lock_assessment(db, assessment_id)
     if not assessment:
         raise HTTPException(status_code=404, detail="Assessment non trovato.")
 
+    # upsert atomico: due salvataggi concorrenti dello stesso item non violano uq_assessment_item
+    _upsert_responses(db, [{"assessment_id": assessment_id, "updated_by_id": user.id, **payload.model_dump()}])
+    refresh_area_scores(db, assessment, [payload.item_id])
     response = (
         db.query(ResponseModel)
         .filter(ResponseModel.assessment_id == assessment_id, ResponseModel.item_id == payload.item_id)
-        .first()
+        .populate_existing()
+        .one()
     )
+    _refresh_summary(db, assessment, user.id)
+    log_action(db, user.id, "update", "response", response.id, "Aggiornato item.")
+    return response
+
 
-    if response:
-        for field, value in payload.model_dump().items():
-            setattr(response, field, value)
-        response.updated_by_id = user.id
+def _upsert_responses(db: Session, rows: list[dict]) -> None:
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(ResponseModel).values(rows)
+        conflict = {"constraint": "uq_assessment_item"}
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(ResponseModel).values(rows)
+        conflict = {"index_elements": [ResponseModel.assessment_id, ResponseModel.item_id]}
     else:
-        response = ResponseModel(
-            assessment_id=assessment_id,
-            updated_by_id=user.id,
-            **payload.model_dump(),
-        )
-        db.add(response)
+        # fallback generico: select + update/insert riga per riga
+        for row in rows:
+            existing = (
+                db.query(ResponseModel)
+                .filter(ResponseModel.assessment_id == row["assessment_id"], ResponseModel.item_id == row["item_id"])
+                .first()
+            )
+            if existing:
+                for field, value in row.items():
+                    setattr(existing, field, value)
+            else:
+                db.add(ResponseModel(**row))
+        db.flush()
+        return
+
+    updatable = [key for key in rows[0] if key not in {"assessment_id", "item_id"}]
+    set_ = {key: stmt.excluded[key] for key in updatable}
+    set_["updated_at"] = func.now()
+    db.execute(stmt.on_conflict_do_update(set_=set_, **conflict))
+
+
+@app.post("/api/assessments/{assessment_id}/responses/bulk", response_model=list[ResponseOut])
+def bulk_upsert_responses(
+    assessment_id: int,
+    payload: ResponseBulk,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    _check_item_ids(item.item_id for item in payload.items)
+    assessment = lock_assessment(db, assessment_id)
+    if not assessment:
+        raise HTTPException(status_code=404, detail="Assessment non trovato.")
 
-    db.commit()
+    # un item ripetuto nello stesso batch: vince l'ultimo valore
+    items = {item.item_id: item.model_dump() for item in payload.items}
+    rows = [{"assessment_id": assessment_id, "updated_by_id": user.id, **values} for values in items.values()]
+    _upsert_responses(db, rows)
+    refresh_area_scores(db, assessment, list(items))
     _refresh_summary(db, assessment, user.id)
-    log_action(db, user.id, "update", "response", response.id, "Aggiornato item.")
-    return response
+    log_action(db, user.id, "update", "assessment", assessment.id, f"Aggiornati {len(rows)} item.")
+    return (
+        db.query(ResponseModel)
+        .filter(ResponseModel.assessment_id == assessment_id, ResponseModel.item_id.in_(list(items)))
+        .all()
+    )
 
 
 @app.get("/api/assessments/{assessment_id}/summary", response_model=SummaryOut)
@@ -417,7 +622,7 @@ def update_summary(
         raise HTTPException(status_code=404, detail="Sintesi non trovata.")
     summary.manual_text = payload.manual_text
     summary.manual_edited_at = datetime.utcnow()
-    db.commit()
+    db.flush()
     log_action(db, user.id, "update", "summary", summary.id, "Modifica sintesi manuale.")
     return summary
 
@@ -447,46 +652,76 @@ def generate_plan(assessment_id: int, db: Session = Depends(get_db), user: User
         is_active=True,
     )
     db.add(plan)
-    db.commit()
+    db.flush()
     log_action(db, user.id, "generate", "plan", plan.id, "Generato piano educativo.")
     return plan
 
 
+PLAN_ROWS = RowSerializer(PlanOut, Plan, json_fields=("content_json",))
+# i contenuti del piano sono la quasi totalità del payload: nelle liste solo con fields=
+PLAN_SUMMARY_FIELDS = [name for name in PLAN_ROWS.fields if name not in ("content_json", "content_text")]
+
+
 @app.get("/api/assessments/{assessment_id}/plans", response_model=list[PlanOut])
-def list_plans(assessment_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    return db.query(Plan).filter(Plan.assessment_id == assessment_id).order_by(Plan.version.desc()).all()
+def list_plans(
+    assessment_id: int,
+    response: Response,
+    active_only: bool = False,
+    fields: str | None = None,
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    rows = PLAN_ROWS.fieldset(fields, PLAN_SUMMARY_FIELDS)
+    query = rows.query(db, Plan.version, Plan.id).filter(Plan.assessment_id == assessment_id)
+    if active_only:
+        query = query.filter(Plan.is_active.is_(True))
+    plans, next_cursor = paginate(query, [(Plan.version, True), (Plan.id, True)], cursor, limit)
+    set_next_cursor(response, next_cursor)
+    return rows.response(plans, response)
+
+
+@app.get("/api/plans/{plan_id}", response_model=PlanOut)
+def get_plan(plan_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    plan = db.get(Plan, plan_id)
+    assessment = db.get(Assessment, plan.assessment_id) if plan else None
+    if not assessment or (assessment.is_deleted and user.role != "admin"):
+        raise HTTPException(status_code=404, detail="Piano non trovato.")
+    return plan
 
 
 # =========================
 # Dashboards
 # =========================
 @app.get("/api/dashboard/profile/{profile_id}")
-def dashboard_profile(profile_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    assessments = (
-        db.query(Assessment)
+def dashboard_profile(profile_id: int, db: Session = Depends(get_read_db), user: User = Depends(get_current_user)):
+    rows = (
+        db.query(
+            AssessmentAreaScore.assessment_id,
+            AssessmentAreaScore.assessment_date,
+            AssessmentAreaScore.area_id,
+            AssessmentAreaScore.avg,
+        )
         .filter(
-            Assessment.profile_id == profile_id,
-            Assessment.status == "finalized",
-            Assessment.is_deleted.is_(False),
+            AssessmentAreaScore.profile_id == profile_id,
+            AssessmentAreaScore.in_dashboard.is_(True),
+            AssessmentAreaScore.count > 0,
         )
-        .order_by(Assessment.assessment_date.asc())
+        .order_by(AssessmentAreaScore.assessment_date.asc(), AssessmentAreaScore.assessment_id.asc())
         .all()
     )
     series = []
-    for assessment in assessments:
-        responses = db.query(ResponseModel).filter(ResponseModel.assessment_id == assessment.id).all()
-        area_values = {}
-        for area_id in {ITEM_TO_AREA.get(r.item_id) for r in responses}:
-            supports = [r.support for r in responses if ITEM_TO_AREA.get(r.item_id) == area_id]
-            if supports:
-                area_values[area_id] = sum(supports) / len(supports)
-        series.append(
-            {
-                "assessment_id": assessment.id,
-                "date": assessment.assessment_date.isoformat(),
-                "areas": area_values,
-            }
-        )
+    for row in rows:
+        if not series or series[-1]["assessment_id"] != row.assessment_id:
+            series.append(
+                {
+                    "assessment_id": row.assessment_id,
+                    "date": row.assessment_date.isoformat(),
+                    "areas": {},
+                }
+            )
+        series[-1]["areas"][row.area_id] = row.avg
     return {"series": series}
 
 
@@ -494,7 +729,7 @@ def dashboard_profile(profile_id: int, db: Session = Depends(get_db), user: User
 def compare_assessments(
     assessment_a: int = Query(...),
     assessment_b: int = Query(...),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     user: User = Depends(get_current_user),
 ):
     responses_a = db.query(ResponseModel).filter(ResponseModel.assessment_id == assessment_a).all()
@@ -516,51 +751,20 @@ def compare_assessments(
 def dashboard_item(
     item_id: str,
     max_support: int = 1,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     user: User = Depends(get_current_user),
 ):
-    subquery = (
-        db.query(
-            Assessment.profile_id,
-            func.max(Assessment.assessment_date).label("latest_date"),
-        )
-        .filter(Assessment.status == "finalized", Assessment.is_deleted.is_(False))
-        .group_by(Assessment.profile_id)
-        .subquery()
-    )
-
-    assessments = (
-        db.query(Assessment)
-        .join(
-            subquery,
-            and_(
-                Assessment.profile_id == subquery.c.profile_id,
-                Assessment.assessment_date == subquery.c.latest_date,
-            ),
-        )
-        .all()
-    )
-
-    rows = []
-    for assessment in assessments:
-        response = (
-            db.query(ResponseModel)
-            .filter(ResponseModel.assessment_id == assessment.id, ResponseModel.item_id == item_id)
-            .first()
-        )
-        if response and response.support <= max_support:
-            profile = db.query(Profile).filter(Profile.id == assessment.profile_id).first()
-            rows.append(
-                {
-                    "profile_id": profile.id,
-                    "profile_name": profile.display_name,
-                    "assessment_date": assessment.assessment_date.isoformat(),
-                    "support": response.support,
-                    "freq": response.freq,
-                    "gen": response.gen,
-                }
-            )
-
+    rows = [
+        {
+            "profile_id": row.profile_id,
+            "profile_name": row.profile_name,
+            "assessment_date": row.assessment_date.isoformat(),
+            "support": row.support,
+            "freq": row.freq,
+            "gen": row.gen,
+        }
+        for row in item_results_query(db, item_id, max_support).all()
+    ]
     return {"item_id": item_id, "results": rows}
 
 
@@ -582,21 +786,37 @@ def create_group(payload: WorkGroupCreate, db: Session = Depends(get_db), user:
         status=payload.status,
     )
     db.add(group)
-    db.commit()
+    db.flush()
 
     for profile_id in payload.member_profile_ids:
         db.add(GroupMember(group_id=group.id, profile_id=profile_id))
     for user_id in payload.assignee_user_ids:
         db.add(GroupAssignee(group_id=group.id, user_id=user_id))
-    db.commit()
+    db.flush()
 
     log_action(db, user.id, "create", "group", group.id, "Creato gruppo di lavoro.")
     return _group_out(group)
 
 
 @app.get("/api/work-groups", response_model=list[WorkGroupOut])
-def list_groups(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    return [_group_out(group) for group in db.query(WorkGroup).order_by(WorkGroup.created_at.desc()).all()]
+def list_groups(
+    response: Response,
+    status: str | None = None,
+    item_id: str | None = None,
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    query = db.query(WorkGroup)
+    if status:
+        query = query.filter(WorkGroup.status == status)
+    if item_id:
+        query = query.filter(WorkGroup.item_id == item_id)
+    # id crescente come created_at: ordinamento stabile sulla chiave primaria
+    groups, next_cursor = paginate(query, [(WorkGroup.id, True)], cursor, limit)
+    set_next_cursor(response, next_cursor)
+    return [_group_out(group) for group in groups]
 
 
 @app.patch("/api/work-groups/{group_id}", response_model=WorkGroupOut)
@@ -620,7 +840,7 @@ def update_group(group_id: int, payload: WorkGroupUpdate, db: Session = Depends(
         for user_id in payload.assignee_user_ids:
             db.add(GroupAssignee(group_id=group_id, user_id=user_id))
 
-    db.commit()
+    db.flush()
     log_action(db, user.id, "update", "group", group.id, "Aggiornato gruppo.")
     return _group_out(group)
 
@@ -633,7 +853,6 @@ def delete_group(group_id: int, db: Session = Depends(get_db), user: User = Depe
     if not group:
         raise HTTPException(status_code=404, detail="Gruppo non trovato.")
     db.delete(group)
-    db.commit()
     log_action(db, user.id, "delete", "group", group_id, "Eliminato gruppo.")
     return {"ok": True}
 
@@ -661,9 +880,123 @@ def _group_out(group: WorkGroup) -> WorkGroupOut:
 # =========================
 # Audit
 # =========================
+AUDIT_ROWS = RowSerializer(AuditOut, AuditLog, actor_user_id=AuditLog.user_id)
+
+
 @app.get("/api/audit", response_model=list[AuditOut], dependencies=[Depends(require_admin)])
-def list_audit(db: Session = Depends(get_db)):
-    return db.query(AuditLog).order_by(AuditLog.created_at.desc()).limit(200).all()
+def list_audit(
+    response: Response,
+    user_id: int | None = None,
+    action: str | None = None,
+    entity_type: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    include_archive: bool = False,
+    cursor: str | None = None,
+    limit: int = Query(200, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+):
+    # le voci ancora nel buffer di questo processo diventano subito visibili
+    flush_audit()
+    query = AUDIT_ROWS.query(db)
+    if user_id:
+        query = query.filter(AuditLog.user_id == user_id)
+    if action:
+        query = query.filter(AuditLog.action == action)
+    if entity_type:
+        query = query.filter(AuditLog.entity_type == entity_type)
+    if date_from:
+        query = query.filter(AuditLog.created_at >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        query = query.filter(AuditLog.created_at < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    # id crescente come created_at: ordinamento stabile sulla chiave primaria
+    order = [(AuditLog.id, True)]
+    entries, next_cursor = paginate(query, order, cursor, limit)
+    if include_archive and next_cursor is None:
+        # le voci archiviate hanno id più bassi di quelle in tabella: la pagina
+        # prosegue negli archivi mensili con lo stesso cursore per id
+        before_id = entries[-1].id if entries else (decode_cursor(cursor, order)[0] if cursor else None)
+        remaining = limit - len(entries)
+        settings = get_settings()
+        archived = search_archive(
+            settings.audit_archive_dir, user_id, action, entity_type, date_from, date_to, before_id, remaining + 1
+        )
+        entries = [
+            *entries,
+            *(
+                AUDIT_ROWS.row(
+                    {**row, "actor_user_id": row["user_id"], "created_at": datetime.fromisoformat(row["created_at"])}
+                )
+                for row in archived[:remaining]
+            ),
+        ]
+        if len(archived) > remaining:
+            next_cursor = encode_cursor([entries[-1].id])
+    set_next_cursor(response, next_cursor)
+    return AUDIT_ROWS.response(entries, response)
+
+
+# =========================
+# Jobs (export in background)
+# =========================
+def _get_job(db: Session, job_id: int, user: User) -> Job:
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job or (job.created_by_id != user.id and user.role != "admin"):
+        raise HTTPException(status_code=404, detail="Job non trovato.")
+    return job
+
+
+@app.post("/api/jobs", response_model=JobOut, status_code=status.HTTP_202_ACCEPTED)
+def create_job(payload: JobCreate, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    try:
+        job = submit_job(db, payload.kind, payload.params, user.id)
+    except JobQueueFull as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
+    log_action(db, user.id, "create", "job", job.id, f"Job {payload.kind} in coda.")
+    return job
+
+
+@app.get("/api/jobs/{job_id}", response_model=JobOut)
+def get_job(job_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    return _get_job(db, job_id, user)
+
+
+@app.get("/api/jobs/{job_id}/artifact")
+def download_job_artifact(job_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    job = _get_job(db, job_id, user)
+    if job.status != "done" or not job.artifact_path or not Path(job.artifact_path).exists():
+        raise HTTPException(status_code=409, detail="Risultato non ancora disponibile.")
+    return FileResponse(job.artifact_path, media_type="application/pdf", filename=job.artifact_name)
+
+
+# =========================
+# Manutenzione (admin)
+# =========================
+@app.post("/api/admin/area-scores/check", dependencies=[Depends(require_admin)])
+def check_area_scores_endpoint(
+    assessment_id: int | None = None,
+    repair: bool = False,
+    db: Session = Depends(get_db),
+    actor: User = Depends(get_current_user),
+):
+    query = db.query(Assessment)
+    if assessment_id:
+        query = query.filter(Assessment.id == assessment_id)
+    assessments = query.order_by(Assessment.id).all()
+    drifted = check_area_scores(db, assessments, repair=repair)
+    if repair and drifted:
+        for assessment in assessments:
+            if assessment.id in drifted:
+                _refresh_summary(db, assessment, actor.id)
+        log_action(db, actor.id, "repair", "area_scores", None, f"Ricostruiti aggregati per {len(drifted)} assessment.")
+    return {"checked": len(assessments), "drifted": drifted, "repaired": repair and bool(drifted)}
+
+
+@app.get("/api/admin/metrics", dependencies=[Depends(require_admin)])
+def get_metrics():
+    return metrics.snapshot()
 
 
 # =========================
@@ -673,157 +1006,370 @@ def _pdf_response(content: bytes, filename: str) -> Response:
     return Response(content, media_type="application/pdf", headers={"Content-Disposition": f"attachment; filename={filename}"})
 
 
-@app.get("/api/exports/assessments.csv")
-def export_assessments_csv(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    assessments = (
-        db.query(Assessment)
-        .filter(Assessment.is_deleted.is_(False), Assessment.status == "finalized")
-        .all()
-    )
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["id", "profile_id", "assessment_date", "status", "operator_name", "operator_role"])
-    for a in assessments:
-        writer.writerow([a.id, a.profile_id, a.assessment_date, a.status, a.operator_name, a.operator_role])
-    log_action(db, user.id, "export", "assessment", None, "Export CSV assessments.")
-    return Response(output.getvalue(), media_type="text/csv")
+def _cached_pdf_response(request: Request, kind: str, source: tuple[str, dict], filename: str) -> Response:
+    key, data = source
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        metrics.incr("pdf_cache.not_modified")
+        return Response(status_code=304, headers=headers)
+    response = _pdf_response(reports.render_cached(kind, key, data), filename)
+    response.headers.update(headers)
+    return response
 
 
-@app.get("/api/exports/item/{item_id}.csv")
-def export_item_csv(item_id: str, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    dashboard = dashboard_item(item_id, db=db, user=user)
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["profile_id", "profile_name", "assessment_date", "support", "freq", "gen"])
-    for row in dashboard["results"]:
-        writer.writerow([row["profile_id"], row["profile_name"], row["assessment_date"], row["support"], row["freq"], row["gen"]])
-    log_action(db, user.id, "export", "dashboard_item", None, f"Export CSV item {item_id}.")
-    return Response(output.getvalue(), media_type="text/csv")
+EXPORT_CHUNK_ROWS = 500
+
+
+def _csv_stream(header: list[str], fetch_rows, session_factory=SessionLocal) -> StreamingResponse:
+    # il generatore usa una sessione propria: la richiesta può essere già chiusa
+    # mentre il client riceve ancora i dati. session_factory: vedi read_session_factory
+    def generate():
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(header)
+        yield output.getvalue()
+        output.seek(0)
+        output.truncate(0)
+
+        db = session_factory()
+        try:
+            for count, row in enumerate(fetch_rows(db), start=1):
+                writer.writerow(row)
+                if count % EXPORT_CHUNK_ROWS == 0:
+                    yield output.getvalue()
+                    output.seek(0)
+                    output.truncate(0)
+            yield output.getvalue()
+        finally:
+            db.close()
+
+    return StreamingResponse(generate(), media_type="text/csv")
+
+
+def _ndjson_stream(fetch_records, session_factory=SessionLocal) -> StreamingResponse:
+    def generate():
+        db = session_factory()
+        try:
+            chunk = []
+            for record in fetch_records(db):
+                chunk.append(json.dumps(record, ensure_ascii=False, default=lambda value: value.isoformat()))
+                if len(chunk) == EXPORT_CHUNK_ROWS:
+                    yield "\n".join(chunk) + "\n"
+                    chunk = []
+            if chunk:
+                yield "\n".join(chunk) + "\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+RESPONSE_EXPORT_FIELDS = [
+    "response_id",
+    "assessment_id",
+    "profile_id",
+    "profile_code",
+    "assessment_date",
+    "status",
+    "operator_name",
+    "operator_role",
+    "item_id",
+    "area_id",
+    "support",
+    "freq",
+    "gen",
+    "updated_at",
+    "cursor",
+]
+
+
+def _response_export_records(updated_since: datetime | None, cursor: str | None):
+    # formato lungo: una riga per risposta; il cursore di ogni riga permette
+    # di riprendere un download interrotto subito dopo l'ultima riga ricevuta
+    order = [(ResponseModel.id, False)]
+    after_id = decode_cursor(cursor, order)[0] if cursor else None
+    if updated_since and updated_since.tzinfo:
+        updated_since = updated_since.astimezone(timezone.utc).replace(tzinfo=None)
+
+    def fetch_records(db: Session):
+        query = (
+            db.query(
+                ResponseModel.id,
+                ResponseModel.assessment_id,
+                Assessment.profile_id,
+                Profile.code,
+                Assessment.assessment_date,
+                Assessment.status,
+                Assessment.operator_name,
+                Assessment.operator_role,
+                ResponseModel.item_id,
+                ResponseModel.support,
+                ResponseModel.freq,
+                ResponseModel.gen,
+                ResponseModel.updated_at,
+                Assessment.updated_at.label("assessment_updated_at"),
+                Profile.updated_at.label("profile_updated_at"),
+            )
+            .join(Assessment, Assessment.id == ResponseModel.assessment_id)
+            .join(Profile, Profile.id == Assessment.profile_id)
+            .filter(Assessment.is_deleted.is_(False))
+        )
+        if updated_since:
+            # le righe riportano anche stato, operatore e codice profilo: cambiano
+            # quando cambia la risposta, l'assessment o il profilo
+            query = query.filter(
+                or_(
+                    ResponseModel.updated_at >= updated_since,
+                    Assessment.updated_at >= updated_since,
+                    Profile.updated_at >= updated_since,
+                )
+            )
+        if after_id is not None:
+            query = query.filter(ResponseModel.id > after_id)
+        for row in query.order_by(ResponseModel.id).yield_per(EXPORT_CHUNK_ROWS):
+            yield {
+                "response_id": row.id,
+                "assessment_id": row.assessment_id,
+                "profile_id": row.profile_id,
+                "profile_code": row.code,
+                "assessment_date": row.assessment_date,
+                "status": row.status,
+                "operator_name": row.operator_name,
+                "operator_role": row.operator_role,
+                "item_id": row.item_id,
+                "area_id": ITEM_TO_AREA.get(row.item_id),
+                "support": row.support,
+                "freq": row.freq,
+                "gen": row.gen,
+                "updated_at": max(row.updated_at, row.assessment_updated_at, row.profile_updated_at),
+                "cursor": encode_cursor([row.id]),
+            }
 
+    return fetch_records
 
-@app.get("/api/exports/assessment/{assessment_id}.pdf")
-def export_assessment_pdf(assessment_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    from reportlab.lib.pagesizes import A4
-    from reportlab.pdfgen import canvas
 
-    assessment = db.query(Assessment).filter(Assessment.id == assessment_id).first()
-    if not assessment:
-        raise HTTPException(status_code=404, detail="Assessment non trovato.")
-    profile = db.query(Profile).filter(Profile.id == assessment.profile_id).first()
-    responses = db.query(ResponseModel).filter(ResponseModel.assessment_id == assessment_id).all()
-    summary = db.query(Summary).filter(Summary.assessment_id == assessment_id).first()
+@app.get("/api/exports/responses.ndjson")
+def export_responses_ndjson(
+    request: Request,
+    updated_since: datetime | None = None,
+    cursor: str | None = None,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    fetch_records = _response_export_records(updated_since, cursor)
+    log_action(db, user.id, "export", "response", None, "Export NDJSON risposte.")
+    return _ndjson_stream(fetch_records, read_session_factory(request))
+
+
+@app.get("/api/exports/responses.csv")
+def export_responses_csv(
+    request: Request,
+    updated_since: datetime | None = None,
+    cursor: str | None = None,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    fetch_records = _response_export_records(updated_since, cursor)
+
+    def fetch_rows(stream_db: Session):
+        for record in fetch_records(stream_db):
+            yield [record[field] for field in RESPONSE_EXPORT_FIELDS]
+
+    log_action(db, user.id, "export", "response", None, "Export CSV risposte.")
+    return _csv_stream(RESPONSE_EXPORT_FIELDS, fetch_rows, read_session_factory(request))
 
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    y = 800
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(40, y, "EduFAD - Report Assessment")
-    y -= 20
-    c.setFont("Helvetica", 10)
 
-    age = assessment.assessment_date.year - profile.date_of_birth.year - (
-        (assessment.assessment_date.month, assessment.assessment_date.day) < (profile.date_of_birth.month, profile.date_of_birth.day)
+@app.get("/api/exports/assessments.csv")
+def export_assessments_csv(request: Request, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    def fetch_rows(stream_db: Session):
+        return (
+            stream_db.query(
+                Assessment.id,
+                Assessment.profile_id,
+                Assessment.assessment_date,
+                Assessment.status,
+                Assessment.operator_name,
+                Assessment.operator_role,
+            )
+            .filter(Assessment.is_deleted.is_(False), Assessment.status == "finalized")
+            .order_by(Assessment.id)
+            .yield_per(EXPORT_CHUNK_ROWS)
+        )
+
+    log_action(db, user.id, "export", "assessment", None, "Export CSV assessments.")
+    return _csv_stream(
+        ["id", "profile_id", "assessment_date", "status", "operator_name", "operator_role"],
+        fetch_rows,
+        read_session_factory(request),
     )
-    c.drawString(40, y, f"Profilo: {profile.display_name} (DOB {profile.date_of_birth}, età {age} anni)")
-    y -= 14
-    c.drawString(40, y, f"Data: {assessment.assessment_date} | Operatore: {assessment.operator_name} ({assessment.operator_role})")
-    y -= 14
-    c.drawString(40, y, f"Versione checklist: {CHECKLIST.get('version')}")
-    y -= 20
-
-    if summary and summary.auto_text:
-        c.drawString(40, y, "Sintesi:")
-        y -= 14
-        for line in summary.auto_text.split(". "):
-            c.drawString(50, y, line.strip())
-            y -= 12
-
-    y -= 10
-    c.drawString(40, y, "Risposte:")
-    y -= 14
-    for resp in responses:
-        c.drawString(50, y, f"{resp.item_id}: S{resp.support} F{resp.freq or '-'} G{resp.gen or '-'}")
-        y -= 12
-        if y < 60:
-            c.showPage()
-            y = 800
-
-    c.setFont("Helvetica-Oblique", 8)
-    c.drawString(40, 30, "Strumento educativo/osservativo, non diagnostico o terapeutico.")
-    c.showPage()
-    c.save()
 
-    log_action(db, user.id, "export", "assessment_pdf", assessment_id, "Export PDF assessment.")
-    return _pdf_response(buffer.getvalue(), f"assessment_{assessment_id}.pdf")
 
+@app.get("/api/exports/item/{item_id}.csv")
+def export_item_csv(item_id: str, request: Request, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    def fetch_rows(stream_db: Session):
+        for row in item_results_query(stream_db, item_id, 1).yield_per(EXPORT_CHUNK_ROWS):
+            yield [row.profile_id, row.profile_name, row.assessment_date.isoformat(), row.support, row.freq, row.gen]
 
-@app.get("/api/exports/item/{item_id}.pdf")
-def export_item_pdf(item_id: str, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    from reportlab.lib.pagesizes import A4
-    from reportlab.pdfgen import canvas
-
-    dashboard = dashboard_item(item_id, db=db, user=user)
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    y = 800
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(40, y, f"EduFAD - Dashboard Item {item_id}")
-    y -= 20
-    c.setFont("Helvetica", 10)
-    c.drawString(40, y, f"Esportato da: {user.username}")
-    y -= 14
-
-    for row in dashboard["results"]:
-        c.drawString(40, y, f"{row['profile_name']} - {row['assessment_date']} - S{row['support']}")
-        y -= 12
-        if y < 60:
-            c.showPage()
-            y = 800
-
-    c.setFont("Helvetica-Oblique", 8)
-    c.drawString(40, 30, "Strumento educativo/osservativo, non diagnostico o terapeutico.")
-    c.showPage()
-    c.save()
+    log_action(db, user.id, "export", "dashboard_item", None, f"Export CSV item {item_id}.")
+    return _csv_stream(
+        ["profile_id", "profile_name", "assessment_date", "support", "freq", "gen"], fetch_rows, read_session_factory(request)
+    )
 
-    log_action(db, user.id, "export", "dashboard_item_pdf", None, f"Export PDF item {item_id}.")
-    return _pdf_response(buffer.getvalue(), f"item_{item_id}.pdf")
 
+@app.get("/api/exports/assessment/{assessment_id}.pdf")
+def export_assessment_pdf(
+    assessment_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    read_db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+):
+    try:
+        source = reports.assessment_source(read_db, assessment_id)
+    except reports.ReportNotFound as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    log_action(db, user.id, "export", "assessment_pdf", assessment_id, "Export PDF assessment.")
+    return _cached_pdf_response(request, "assessment", source, f"assessment_{assessment_id}.pdf")
 
-@app.get("/api/exports/plan/{plan_id}.pdf")
-def export_plan_pdf(plan_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    from reportlab.lib.pagesizes import A4
-    from reportlab.pdfgen import canvas
 
-    plan = db.query(Plan).filter(Plan.id == plan_id).first()
-    if not plan:
-        raise HTTPException(status_code=404, detail="Piano non trovato.")
+@app.get("/api/exports/item/{item_id}.pdf")
+def export_item_pdf(
+    item_id: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    read_db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+):
+    source = reports.item_source(read_db, item_id, user.username)
+    log_action(db, user.id, "export", "dashboard_item_pdf", None, f"Export PDF item {item_id}.")
+    return _cached_pdf_response(request, "item", source, f"item_{item_id}.pdf")
 
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    y = 800
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(40, y, f"EduFAD - Piano Educativo v{plan.version}")
-    y -= 20
-    c.setFont("Helvetica", 10)
-
-    for line in (plan.content_text or "").split("\n"):
-        c.drawString(40, y, line[:110])
-        y -= 12
-        if y < 60:
-            c.showPage()
-            y = 800
-
-    c.setFont("Helvetica-Oblique", 8)
-    c.drawString(40, 30, "Strumento educativo/osservativo, non diagnostico o terapeutico.")
-    c.showPage()
-    c.save()
 
+@app.get("/api/exports/plan/{plan_id}.pdf")
+def export_plan_pdf(
+    plan_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    read_db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+):
+    try:
+        source = reports.plan_source(read_db, plan_id)
+    except reports.ReportNotFound as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
     log_action(db, user.id, "export", "plan_pdf", plan_id, "Export PDF piano.")
-    return _pdf_response(buffer.getvalue(), f"plan_{plan_id}.pdf")
+    return _cached_pdf_response(request, "plan", source, f"plan_{plan_id}.pdf")
+
+
+ZIP_MAX_ASSESSMENTS = 2000
+
+
+class _ZipSink(io.RawIOBase):
+    # destinazione non seekable: zipfile scrive i data descriptor dopo ogni file
+    def __init__(self):
+        self.chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _zip_stream(entries: list[tuple[str, str, str, dict]]):
+    cache = get_pdf_cache()
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+        # i PDF già in cache partono subito, gli altri escono appena il pool li completa
+        pending = {}
+        try:
+            for filename, kind, key, data in entries:
+                content = cache.get(key)
+                if content is None:
+                    pending[reports.get_render_pool().submit(reports.render_report, kind, data)] = (filename, key)
+                else:
+                    archive.writestr(filename, content)
+                    yield sink.drain()
+            for future in as_completed(pending):
+                filename, key = pending[future]
+                content = future.result()
+                cache.put(key, content)
+                archive.writestr(filename, content)
+                yield sink.drain()
+        finally:
+            # client disconnesso (generatore chiuso) o errore: i render non ancora partiti non servono più
+            for future in pending:
+                future.cancel()
+    yield sink.drain()
+
+
+def _zip_name(code: str) -> str:
+    # il codice profilo diventa una cartella dello ZIP: niente separatori né ".." (zip-slip)
+    return re.sub(r"[^\w.-]", "_", code).lstrip(".") or "profilo"
+
+
+@app.post("/api/exports/reports.zip")
+@read_mostly
+def export_reports_zip(
+    payload: ReportsZipRequest,
+    db: Session = Depends(get_db),
+    read_db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+):
+    if not (payload.profile_ids or payload.group_id or payload.date_from or payload.date_to):
+        raise HTTPException(status_code=400, detail="Indicare profili, gruppo o intervallo di date.")
+
+    query = (
+        read_db.query(Assessment.id, Assessment.assessment_date, Profile.code)
+        .join(Profile, Profile.id == Assessment.profile_id)
+        .filter(Assessment.is_deleted.is_(False))
+    )
+    if payload.profile_ids:
+        query = query.filter(Assessment.profile_id.in_(payload.profile_ids))
+    if payload.group_id:
+        if not read_db.get(WorkGroup, payload.group_id):
+            raise HTTPException(status_code=404, detail="Gruppo non trovato.")
+        members = read_db.query(GroupMember.profile_id).filter(GroupMember.group_id == payload.group_id)
+        query = query.filter(Assessment.profile_id.in_(members.scalar_subquery()))
+    if payload.date_from:
+        query = query.filter(Assessment.assessment_date >= payload.date_from)
+    if payload.date_to:
+        query = query.filter(Assessment.assessment_date <= payload.date_to)
+    rows = query.order_by(Profile.code, Assessment.assessment_date, Assessment.id).limit(ZIP_MAX_ASSESSMENTS + 1).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Nessun assessment trovato.")
+    if len(rows) > ZIP_MAX_ASSESSMENTS:
+        raise HTTPException(status_code=400, detail=f"Troppi assessment (massimo {ZIP_MAX_ASSESSMENTS}).")
+
+    assessment_ids = [row.id for row in rows]
+    sources = reports.assessment_sources(read_db, assessment_ids)
+    plans = reports.active_plan_sources(read_db, assessment_ids)
+    entries = []
+    for row in rows:
+        prefix = f"{_zip_name(row.code)}/{row.assessment_date.isoformat()}_assessment_{row.id}"
+        entries.append((f"{prefix}.pdf", "assessment", *sources[row.id]))
+        if row.id in plans:
+            plan_id, key, data = plans[row.id]
+            entries.append((f"{prefix}_plan_{plan_id}.pdf", "plan", key, data))
+
+    log_action(db, user.id, "export", "reports_zip", None, f"Export ZIP di {len(rows)} assessment.")
+    return StreamingResponse(
+        _zip_stream(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=reports.zip"},
+    )
 
 
 # =========================
 # Static (SPA)
 # =========================
-static_dir = Path(__file__).resolve().parents[1] / "static"
-app.mount("/", StaticFiles(directory=static_dir, html=True), name="static")
+# static_dist (python -m app.cli build-static) se presente: nomi con hash e varianti .br/.gz
+static_dir = STATIC_BUILD_DIR if (STATIC_BUILD_DIR / "index.html").exists() else STATIC_SOURCE_DIR
+app.mount("/", PrecompressedStaticFiles(directory=static_dir, html=True), name="static")
@@ -0,0 +1,183 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .models import Assessment, AssessmentAreaScore, Profile, Response
+from .services import ITEM_TO_AREA, area_stats
+
+
+# Stato derivato mantenuto in modo incrementale: per ogni assessment e area
+# teniamo somma del supporto, numero di item, item critici (supporto <= 1) e
+# media, più una copia di profilo/data/visibilità per la dashboard profilo.
+
+AREA_ITEMS = {
+    area_id: [item_id for item_id, item_area in ITEM_TO_AREA.items() if item_area == area_id]
+    for area_id in set(ITEM_TO_AREA.values())
+}
+
+
+def in_dashboard(assessment: Assessment) -> bool:
+    return assessment.status == "finalized" and not assessment.is_deleted
+
+
+def refresh_area_scores(db: Session, assessment: Assessment, item_ids) -> None:
+    # ricalcola da responses le sole aree degli item toccati, dopo averli scritti
+    # nella stessa transazione: niente delta calcolati da letture precedenti,
+    # che con salvataggi concorrenti verrebbero applicati due volte.
+    # Su PostgreSQL il chiamante tiene il lock sulla riga dell'assessment
+    # (lock_assessment); su SQLite il lock di scrittura è già preso dall'upsert.
+    area_ids = sorted({ITEM_TO_AREA[item_id] for item_id in item_ids if item_id in ITEM_TO_AREA})
+    if not area_ids:
+        return
+    db.flush()
+    items = [item_id for area_id in area_ids for item_id in AREA_ITEMS[area_id]]
+    rows = (
+        db.query(Response.item_id, Response.support)
+        .filter(Response.assessment_id == assessment.id, Response.item_id.in_(items))
+        .all()
+    )
+    stats = area_stats([{"item_id": item_id, "support": support} for item_id, support in rows])
+    _upsert_area_scores(db, [_score_values(assessment, area_id, *stats.get(area_id, (0, 0, 0))) for area_id in area_ids])
+
+
+def lock_assessment(db: Session, assessment_id: int) -> Assessment | None:
+    # SELECT ... FOR UPDATE: serializza le scritture delle risposte di uno stesso
+    # assessment (su SQLite il FOR UPDATE non esiste e basta il lock del database)
+    return (
+        db.query(Assessment)
+        .filter(Assessment.id == assessment_id, Assessment.is_deleted.is_(False))
+        .with_for_update()
+        .first()
+    )
+
+
+def sync_assessment_scores(db: Session, assessment: Assessment) -> None:
+    # da chiamare quando cambiano stato, data, profilo o soft-delete
+    db.query(AssessmentAreaScore).filter(AssessmentAreaScore.assessment_id == assessment.id).update(
+        {
+            AssessmentAreaScore.profile_id: assessment.profile_id,
+            AssessmentAreaScore.assessment_date: assessment.assessment_date,
+            AssessmentAreaScore.in_dashboard: in_dashboard(assessment),
+        },
+        synchronize_session=False,
+    )
+
+
+def load_area_stats(db: Session, assessment_id: int) -> dict[str, tuple[int, int, int]]:
+    rows = (
+        db.query(AssessmentAreaScore.area_id, AssessmentAreaScore.support_sum, AssessmentAreaScore.count, AssessmentAreaScore.low_count)
+        .filter(AssessmentAreaScore.assessment_id == assessment_id)
+        .all()
+    )
+    return {area_id: (total, count, low) for area_id, total, count, low in rows if count}
+
+
+def compute_area_stats(db: Session, assessment_id: int) -> dict[str, tuple[int, int, int]]:
+    rows = db.query(Response.item_id, Response.support).filter(Response.assessment_id == assessment_id).all()
+    return area_stats([{"item_id": item_id, "support": support} for item_id, support in rows])
+
+
+def rebuild_area_scores(db: Session, assessment: Assessment) -> dict[str, tuple[int, int, int]]:
+    stats = compute_area_stats(db, assessment.id)
+    db.query(AssessmentAreaScore).filter(AssessmentAreaScore.assessment_id == assessment.id).delete(synchronize_session=False)
+    for area_id, (total, count, low) in stats.items():
+        db.add(AssessmentAreaScore(**_score_values(assessment, area_id, total, count, low)))
+    db.flush()
+    return stats
+
+
+def check_area_scores(db: Session, assessments: list[Assessment], repair: bool = False) -> list[int]:
+    drifted = []
+    for assessment in assessments:
+        stored = (
+            db.query(AssessmentAreaScore)
+            .filter(AssessmentAreaScore.assessment_id == assessment.id, AssessmentAreaScore.count > 0)
+            .all()
+        )
+        expected = compute_area_stats(db, assessment.id)
+        consistent = {row.area_id: (row.support_sum, row.count, row.low_count) for row in stored} == expected and all(
+            row.profile_id == assessment.profile_id
+            and row.assessment_date == assessment.assessment_date
+            and row.in_dashboard == in_dashboard(assessment)
+            for row in stored
+        )
+        if not consistent:
+            drifted.append(assessment.id)
+            if repair:
+                rebuild_area_scores(db, assessment)
+    return drifted
+
+
+def latest_assessment_id(db: Session, profile_id: int) -> int | None:
+    row = (
+        db.query(Assessment.id)
+        .filter(
+            Assessment.profile_id == profile_id,
+            Assessment.status == "finalized",
+            Assessment.is_deleted.is_(False),
+        )
+        .order_by(Assessment.assessment_date.desc(), Assessment.id.desc())
+        .first()
+    )
+    return row.id if row else None
+
+
+def refresh_latest_assessment(db: Session, *profile_ids: int | None) -> None:
+    # da chiamare nella stessa transazione della modifica all'assessment
+    db.flush()
+    for profile_id in {pid for pid in profile_ids if pid is not None}:
+        db.query(Profile).filter(Profile.id == profile_id).update(
+            {Profile.latest_assessment_id: latest_assessment_id(db, profile_id)},
+            synchronize_session=False,
+        )
+
+
+def repair_latest_assessments(db: Session) -> list[int]:
+    drifted = []
+    for profile_id, stored in db.query(Profile.id, Profile.latest_assessment_id).order_by(Profile.id).all():
+        expected = latest_assessment_id(db, profile_id)
+        if stored != expected:
+            drifted.append(profile_id)
+            db.query(Profile).filter(Profile.id == profile_id).update(
+                {Profile.latest_assessment_id: expected},
+                synchronize_session=False,
+            )
+    return drifted
+
+
+def _score_values(assessment: Assessment, area_id: str, total: int, count: int, low: int) -> dict:
+    return {
+        "assessment_id": assessment.id,
+        "area_id": area_id,
+        "support_sum": total,
+        "count": count,
+        "low_count": low,
+        "avg": total / count if count else None,
+        "profile_id": assessment.profile_id,
+        "assessment_date": assessment.assessment_date,
+        "in_dashboard": in_dashboard(assessment),
+    }
+
+
+def _upsert_area_scores(db: Session, rows: list[dict]) -> None:
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(AssessmentAreaScore).values(rows)
+        conflict = {"constraint": "uq_assessment_area"}
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(AssessmentAreaScore).values(rows)
+        conflict = {"index_elements": [AssessmentAreaScore.assessment_id, AssessmentAreaScore.area_id]}
+    else:
+        # fallback generico: update o insert riga per riga
+        for row in rows:
+            updated = (
+                db.query(AssessmentAreaScore)
+                .filter(AssessmentAreaScore.assessment_id == row["assessment_id"], AssessmentAreaScore.area_id == row["area_id"])
+                .update(row, synchronize_session=False)
+            )
+            if not updated:
+                db.add(AssessmentAreaScore(**row))
+        db.flush()
+        return
+
+    set_ = {key: stmt.excluded[key] for key in rows[0] if key not in {"assessment_id", "area_id"}}
+    db.execute(stmt.on_conflict_do_update(set_=set_, **conflict))
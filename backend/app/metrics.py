@@ -0,0 +1,39 @@
+import threading
+from collections import defaultdict
+
+
+# Contatori di processo esposti da /api/admin/metrics. Con più worker uvicorn
+# ogni processo ha i propri valori.
+
+_lock = threading.Lock()
+_counters: dict[str, int] = defaultdict(int)
+_gauges: dict[str, float] = {}
+_timings: dict[str, list[float]] = {}
+
+
+def incr(name: str, value: int = 1) -> None:
+    with _lock:
+        _counters[name] += value
+
+
+def set_gauge(name: str, value: float) -> None:
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name: str, seconds: float) -> None:
+    with _lock:
+        count, total, peak = _timings.get(name, (0, 0.0, 0.0))
+        _timings[name] = [count + 1, total + seconds, max(peak, seconds)]
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "timings": {
+                name: {"count": count, "avg_ms": round(total / count * 1000, 2), "max_ms": round(peak * 1000, 2)}
+                for name, (count, total, peak) in _timings.items()
+            },
+        }
@@ -4,7 +4,9 @@ from sqlalchemy import (
     Boolean,
     Date,
     DateTime,
+    Float,
     ForeignKey,
+    Index,
     Integer,
     JSON,
     String,
@@ -25,12 +27,15 @@ class User(Base):
     password_hash: Mapped[str] = mapped_column(String(255))
     role: Mapped[str] = mapped_column(String(20), default="editor")
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    # incrementato quando cambiano credenziali, ruolo o stato: invalida i token emessi
+    token_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     disclaimer_ack_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
 
 
 class Profile(Base):
     __tablename__ = "profiles"
+    __table_args__ = (Index("ix_profiles_display_name_id", "display_name", "id"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     code: Mapped[str] = mapped_column(String(32), unique=True, index=True)
@@ -39,12 +44,18 @@ class Profile(Base):
     notes: Mapped[str | None] = mapped_column(Text, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # puntatore denormalizzato all'ultimo assessment finalizzato e non eliminato
+    latest_assessment_id: Mapped[int | None] = mapped_column(Integer, nullable=True, index=True)
 
     assessments: Mapped[list["Assessment"]] = relationship(back_populates="profile")
 
 
 class Assessment(Base):
     __tablename__ = "assessments"
+    __table_args__ = (
+        Index("ix_assessments_date_id", "assessment_date", "id"),
+        Index("ix_assessments_profile_date", "profile_id", "assessment_date"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     profile_id: Mapped[int] = mapped_column(ForeignKey("profiles.id"))
@@ -67,11 +78,16 @@ class Assessment(Base):
     responses: Mapped[list["Response"]] = relationship(back_populates="assessment", cascade="all, delete-orphan")
     summary: Mapped["Summary"] = relationship(back_populates="assessment", cascade="all, delete-orphan", uselist=False)
     plans: Mapped[list["Plan"]] = relationship(back_populates="assessment", cascade="all, delete-orphan")
+    area_scores: Mapped[list["AssessmentAreaScore"]] = relationship(back_populates="assessment", cascade="all, delete-orphan")
 
 
 class Response(Base):
     __tablename__ = "responses"
-    __table_args__ = (UniqueConstraint("assessment_id", "item_id", name="uq_assessment_item"),)
+    __table_args__ = (
+        UniqueConstraint("assessment_id", "item_id", name="uq_assessment_item"),
+        Index("ix_responses_item_support", "item_id", "support"),
+        Index("ix_responses_updated_at", "updated_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     assessment_id: Mapped[int] = mapped_column(ForeignKey("assessments.id"))
@@ -87,6 +103,28 @@ class Response(Base):
     assessment: Mapped["Assessment"] = relationship(back_populates="responses")
 
 
+class AssessmentAreaScore(Base):
+    __tablename__ = "assessment_area_scores"
+    __table_args__ = (
+        UniqueConstraint("assessment_id", "area_id", name="uq_assessment_area"),
+        Index("ix_area_scores_profile_dashboard", "profile_id", "in_dashboard", "assessment_date"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    assessment_id: Mapped[int] = mapped_column(ForeignKey("assessments.id"))
+    area_id: Mapped[str] = mapped_column(String(50))
+    support_sum: Mapped[int] = mapped_column(Integer, default=0)
+    count: Mapped[int] = mapped_column(Integer, default=0)
+    low_count: Mapped[int] = mapped_column(Integer, default=0)
+    avg: Mapped[float | None] = mapped_column(Float, nullable=True)
+    # copie denormalizzate dall'assessment per la dashboard profilo
+    profile_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    assessment_date: Mapped[date | None] = mapped_column(Date, nullable=True)
+    in_dashboard: Mapped[bool] = mapped_column(Boolean, default=False)
+
+    assessment: Mapped["Assessment"] = relationship(back_populates="area_scores")
+
+
 class Summary(Base):
     __tablename__ = "summaries"
 
@@ -102,6 +140,7 @@ class Summary(Base):
 
 class Plan(Base):
     __tablename__ = "plans"
+    __table_args__ = (Index("ix_plans_assessment_version", "assessment_id", "version"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     assessment_id: Mapped[int] = mapped_column(ForeignKey("assessments.id"))
@@ -161,7 +200,9 @@ class GroupAssignee(Base):
 
 
 class AuditLog(Base):
+    # su PostgreSQL partizionata per mese su created_at (migrazione 0011)
     __tablename__ = "audit_logs"
+    __table_args__ = (Index("ix_audit_logs_created_at", "created_at"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int | None] = mapped_column(ForeignKey("users.id"), nullable=True)
@@ -170,3 +211,42 @@ class AuditLog(Base):
     entity_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
     details: Mapped[str | None] = mapped_column(Text, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (Index("ix_jobs_status_id", "status", "id"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(30))
+    params: Mapped[dict] = mapped_column(JSON)
+    status: Mapped[str] = mapped_column(String(20), default="queued")
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, default=3)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    artifact_path: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    artifact_name: Mapped[str | None] = mapped_column(String(150), nullable=True)
+    created_by_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    run_after: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class RateLimitHit(Base):
+    # usata dal rate limiter condiviso tra i worker (RATE_LIMIT_BACKEND=database)
+    __tablename__ = "rate_limit_hits"
+    __table_args__ = (Index("ix_rate_limit_hits_key_ts", "key", "ts"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    key: Mapped[str] = mapped_column(String(200))
+    ts: Mapped[float] = mapped_column(Float, index=True)
+
+
+class TableVersion(Base):
+    # contatore di modifiche per tabella: ETag delle liste senza interrogarle (vedi versions)
+    __tablename__ = "table_versions"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
@@ -0,0 +1,62 @@
+import base64
+import json
+from datetime import date, datetime
+
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+# Paginazione keyset: il cursore è opaco per il client e contiene i valori
+# delle chiavi di ordinamento dell'ultima riga restituita.
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order: list[tuple]) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(order):
+            raise ValueError
+        decoded = []
+        for (column, _desc), value in zip(order, values):
+            python_type = column.type.python_type
+            if python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif python_type is date:
+                value = date.fromisoformat(value)
+            decoded.append(value)
+        return decoded
+    except (ValueError, TypeError, NotImplementedError) as exc:
+        raise HTTPException(status_code=400, detail="Cursore non valido.") from exc
+
+
+def paginate(query, order: list[tuple], cursor: str | None, limit: int) -> tuple[list, str | None]:
+    # order: [(colonna, discendente?)], l'ultima colonna deve essere univoca
+    if cursor:
+        values = decode_cursor(cursor, order)
+        clauses = []
+        for i, (column, desc) in enumerate(order):
+            prefix = [order[j][0] == values[j] for j in range(i)]
+            prefix.append(column < values[i] if desc else column > values[i])
+            clauses.append(and_(*prefix))
+        query = query.filter(or_(*clauses))
+
+    query = query.order_by(*[column.desc() if desc else column.asc() for column, desc in order])
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([getattr(rows[-1], column.key) for column, _desc in order])
+
+
+def set_next_cursor(response: Response, next_cursor: str | None) -> None:
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -0,0 +1,80 @@
+import os
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+
+from . import metrics
+from .config import get_settings
+
+
+# Cache su disco dei PDF, indirizzata per contenuto: la chiave è l'hash degli
+# input del rendering, quindi non serve mai invalidare. Eviction LRU in base
+# alla data di ultimo accesso (mtime aggiornato a ogni hit).
+
+
+class ArtifactCache:
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        # stima della dimensione occupata; ricalcolata dal disco a ogni eviction
+        self._size: int | None = None
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.pdf"
+
+    def get(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            content = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            metrics.incr("pdf_cache.misses")
+            return None
+        metrics.incr("pdf_cache.hits")
+        return content
+
+    def put(self, key: str, content: bytes) -> None:
+        if len(content) > self.max_bytes:
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # scrittura atomica: un lettore concorrente non vede mai file parziali
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(content)
+        os.replace(tmp, path)
+        if self._size is None:
+            self._evict()
+        else:
+            self._size += len(content)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        total = 0
+        for path in self.directory.glob("*/*.pdf"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        self._size = total
+        metrics.set_gauge("pdf_cache.bytes", total)
+        if total <= self.max_bytes:
+            return
+        for _mtime, size, path in sorted(entries):
+            path.unlink(missing_ok=True)
+            metrics.incr("pdf_cache.evictions")
+            total -= size
+            if total <= self.max_bytes:
+                break
+        self._size = total
+        metrics.set_gauge("pdf_cache.bytes", total)
+
+
+@lru_cache
+def get_pdf_cache() -> ArtifactCache:
+    settings = get_settings()
+    return ArtifactCache(settings.pdf_cache_dir, settings.pdf_cache_max_mb * 1024 * 1024)
@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+
+from fastapi import HTTPException, Request
+from sqlalchemy import delete, func, select
+
+from .config import get_settings
+from .database import engine as app_engine, get_engine
+from .models import RateLimitHit
+from .sqlitewriter import write_transaction
+
+
+# Finestra scorrevole sui tentativi di login, per username e per IP.
+# Ogni backend espone hit(key, window) -> tentativi nella finestra e reset(key).
+
+
+class MemoryRateLimiter:
+    """Per processo. Memoria limitata: al massimo max_keys chiavi (LRU) e
+    limit timestamp per chiave. A ogni hit vengono rimosse le chiavi il cui
+    ultimo tentativo è fuori dalla finestra (la finestra è la stessa per tutte)."""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._hits: OrderedDict[str, deque] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, window: float, limit: int) -> int:
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.pop(key, None)
+            # ordine LRU = ordine dell'ultimo tentativo: le chiavi scadute sono in testa
+            while self._hits and next(iter(self._hits.values()))[-1] <= now - window:
+                self._hits.popitem(last=False)
+            if hits is None:
+                hits = deque(maxlen=limit + 1)
+            while hits and hits[0] <= now - window:
+                hits.popleft()
+            hits.append(now)
+            self._hits[key] = hits
+            while len(self._hits) > self.max_keys:
+                self._hits.popitem(last=False)
+            return len(hits)
+
+    def count(self, key: str, window: float) -> int:
+        # tentativi nella finestra, senza registrarne uno nuovo
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            return sum(1 for ts in hits if ts > now - window) if hits else 0
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._hits.pop(key, None)
+
+
+class DatabaseRateLimiter:
+    """Condiviso tra i worker tramite la tabella rate_limit_hits."""
+
+    def __init__(self, engine, begin=None):
+        # begin() -> context manager con una connessione in transazione (default engine.begin)
+        self.begin = begin or engine.begin
+
+    def hit(self, key: str, window: float, limit: int) -> int:
+        now = time.time()
+        with self.begin() as conn:
+            # pulizia globale delle righe scadute (indice su ts)
+            conn.execute(delete(RateLimitHit).where(RateLimitHit.ts <= now - window))
+            conn.execute(RateLimitHit.__table__.insert().values(key=key, ts=now))
+            return conn.execute(
+                select(func.count()).select_from(RateLimitHit).where(RateLimitHit.key == key, RateLimitHit.ts > now - window)
+            ).scalar_one()
+
+    def count(self, key: str, window: float) -> int:
+        with self.begin() as conn:
+            return conn.execute(
+                select(func.count())
+                .select_from(RateLimitHit)
+                .where(RateLimitHit.key == key, RateLimitHit.ts > time.time() - window)
+            ).scalar_one()
+
+    def reset(self, key: str) -> None:
+        with self.begin() as conn:
+            conn.execute(delete(RateLimitHit).where(RateLimitHit.key == key))
+
+
+@lru_cache
+def get_rate_limiter():
+    settings = get_settings()
+    if settings.rate_limit_backend == "memory":
+        return MemoryRateLimiter(settings.rate_limit_memory_max_keys)
+    if settings.rate_limit_backend == "database":
+        if not settings.rate_limit_database_url:
+            # database dell'app: con SQLITE_WRITER passa dal writer unico
+            return DatabaseRateLimiter(app_engine, begin=write_transaction)
+        # es. un file SQLite locale, condiviso dai worker sulla stessa macchina
+        engine = get_engine(settings.rate_limit_database_url)
+        RateLimitHit.__table__.create(engine, checkfirst=True)
+        return DatabaseRateLimiter(engine)
+    raise ValueError(f"RATE_LIMIT_BACKEND non valido: {settings.rate_limit_backend}")
+
+
+def client_ip(request: Request) -> str | None:
+    # la connessione arriva da un proxy fidato (FORWARDED_ALLOW_IPS): il client è
+    # il primo indirizzo di X-Forwarded-For, da destra, che non è un proxy fidato
+    peer = request.client.host if request.client else None
+    trusted = {host.strip() for host in get_settings().forwarded_allow_ips.split(",") if host.strip()}
+    if peer is None or ("*" not in trusted and peer not in trusted):
+        return peer
+    forwarded = [host.strip() for host in request.headers.get("x-forwarded-for", "").split(",") if host.strip()]
+    for host in reversed(forwarded):
+        if host not in trusted:
+            return host
+    return forwarded[0] if forwarded else peer
+
+
+def rate_limit_login(username: str, client_ip: str | None) -> None:
+    # prima della verifica delle credenziali. Per l'utente conta ogni tentativo
+    # (azzerato dal login riuscito); per l'IP solo i falliti (record_failed_login),
+    # così molti utenti dietro lo stesso proxy o NAT non si bloccano a vicenda
+    settings = get_settings()
+    limiter = get_rate_limiter()
+    window = settings.login_window_seconds
+    limit = settings.login_max_attempts_per_user
+    blocked = limiter.hit(f"user:{username.lower()}", window, limit) > limit
+    if client_ip and not blocked:
+        blocked = limiter.count(f"ip:{client_ip}", window) >= settings.login_max_attempts_per_ip
+    if blocked:
+        raise HTTPException(status_code=429, detail="Troppi tentativi. Riprova tra pochi minuti.")
+
+
+def record_failed_login(client_ip: str | None) -> None:
+    if client_ip:
+        settings = get_settings()
+        get_rate_limiter().hit(f"ip:{client_ip}", settings.login_window_seconds, settings.login_max_attempts_per_ip)
+
+
+def reset_rate_limit(username: str) -> None:
+    # solo la chiave utente: il contatore per IP resta a protezione dai tentativi su più account
+    get_rate_limiter().reset(f"user:{username.lower()}")
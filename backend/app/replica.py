@@ -0,0 +1,74 @@
+import math
+import time
+
+from fastapi import Depends, Request, Response
+from sqlalchemy.orm import Session, sessionmaker
+
+from .auth import get_db
+from .config import get_settings
+from .database import ASYNC_MODE, AppSession, SessionLocal, get_engine
+
+
+# READ_DATABASE_URL (opzionale): replica in sola lettura per dashboard ed export.
+# Dopo una scrittura il client riceve un cookie valido READ_YOUR_WRITES_SECONDS:
+# finché è valido le sue letture restano sul primario, così non vede dati più
+# vecchi di quelli appena salvati mentre la replica si allinea.
+
+READ_YOUR_WRITES_COOKIE = "edufad_rw"
+
+_settings = get_settings()
+ReadSessionLocal = None
+if _settings.read_database_url:
+    read_engine = get_engine(_settings.read_database_url)
+    ReadSessionLocal = sessionmaker(bind=read_engine, class_=AppSession, autoflush=False, autocommit=False, future=True)
+
+
+def mark_write(response: Response) -> None:
+    window = get_settings().read_your_writes_seconds
+    response.set_cookie(
+        READ_YOUR_WRITES_COOKIE,
+        str(time.time() + window),
+        max_age=math.ceil(window),
+        httponly=True,
+        samesite="lax",
+    )
+
+
+def recent_write(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(READ_YOUR_WRITES_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def read_session_factory(request: Request) -> sessionmaker:
+    # per le sessioni aperte fuori dalle dipendenze (export in streaming)
+    if ReadSessionLocal is None or recent_write(request):
+        return SessionLocal
+    return ReadSessionLocal
+
+
+def get_read_db(request: Request, primary: Session = Depends(get_db)):
+    # la sessione primaria non apre connessioni finché non viene usata
+    if ReadSessionLocal is None or recent_write(request):
+        yield primary
+        return
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+if ASYNC_MODE:
+    from .asyncdb import AsyncReadSessionLocal, async_overrides
+
+    async def get_async_read_db(request: Request, primary: Session = Depends(get_db)):
+        if AsyncReadSessionLocal is None or recent_write(request):
+            yield primary
+            return
+        async with AsyncReadSessionLocal() as db:
+            yield db.sync_session
+
+    # solo per gli handler async (vedi asyncdb)
+    async_overrides[get_read_db] = get_async_read_db
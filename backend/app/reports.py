@@ -0,0 +1,275 @@
+import hashlib
+import io
+import json
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from .checklist import CHECKLIST
+from .config import get_settings
+from .models import Assessment, Plan, Profile, Response, Summary
+from .pdfcache import get_pdf_cache
+
+
+# Rendering PDF condiviso tra le route di export e il worker dei job.
+# Ogni report ha una *_source che legge gli input dal DB e ne calcola la chiave,
+# e una render_* pura che produce il PDF; render_cached passa dalla cache su disco.
+
+DISCLAIMER = "Strumento educativo/osservativo, non diagnostico o terapeutico."
+# da incrementare quando cambia il layout dei PDF: invalida la cache
+RENDER_VERSION = 1
+
+
+class ReportNotFound(LookupError):
+    pass
+
+
+def item_results_query(db: Session, item_id: str, max_support: int):
+    return (
+        db.query(
+            Profile.id.label("profile_id"),
+            Profile.display_name.label("profile_name"),
+            Assessment.assessment_date,
+            Response.support,
+            Response.freq,
+            Response.gen,
+        )
+        .join(Assessment, Assessment.id == Profile.latest_assessment_id)
+        .join(
+            Response,
+            and_(
+                Response.assessment_id == Assessment.id,
+                Response.item_id == item_id,
+                Response.support <= max_support,
+            ),
+        )
+        .order_by(Profile.display_name, Profile.id)
+    )
+
+
+def report_key(kind: str, *parts) -> str:
+    # chiave della cache: hash degli input del rendering (più versione del layout)
+    payload = json.dumps([RENDER_VERSION, kind, *parts], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def assessment_sources(db: Session, assessment_ids: list[int]) -> dict[int, tuple[str, dict]]:
+    # tre query per tutto il lotto, indipendentemente dal numero di assessment
+    rows = (
+        db.query(Assessment, Profile.display_name, Profile.date_of_birth)
+        .join(Profile, Profile.id == Assessment.profile_id)
+        .filter(Assessment.id.in_(assessment_ids))
+        .all()
+    )
+    responses: dict[int, list[tuple]] = {assessment.id: [] for assessment, _, _ in rows}
+    for assessment_id, *values in (
+        db.query(Response.assessment_id, Response.item_id, Response.support, Response.freq, Response.gen)
+        .filter(Response.assessment_id.in_(assessment_ids))
+        .order_by(Response.id)
+    ):
+        responses[assessment_id].append(tuple(values))
+    summaries = dict(
+        db.query(Summary.assessment_id, Summary.auto_text).filter(Summary.assessment_id.in_(assessment_ids)).all()
+    )
+
+    sources = {}
+    for assessment, profile_name, date_of_birth in rows:
+        data = {
+            "profile_name": profile_name,
+            "date_of_birth": date_of_birth,
+            "assessment_date": assessment.assessment_date,
+            "operator_name": assessment.operator_name,
+            "operator_role": assessment.operator_role,
+            "checklist_version": CHECKLIST.get("version"),
+            "summary": summaries.get(assessment.id),
+            "responses": responses[assessment.id],
+        }
+        sources[assessment.id] = (report_key("assessment", assessment.id, assessment.updated_at, data), data)
+    return sources
+
+
+def assessment_source(db: Session, assessment_id: int) -> tuple[str, dict]:
+    sources = assessment_sources(db, [assessment_id])
+    if assessment_id not in sources:
+        raise ReportNotFound("Assessment non trovato.")
+    return sources[assessment_id]
+
+
+def item_source(db: Session, item_id: str, exported_by: str) -> tuple[str, dict]:
+    rows = item_results_query(db, item_id, 1).all()
+    data = {
+        "item_id": item_id,
+        "exported_by": exported_by,
+        "rows": [(row.profile_name, row.assessment_date, row.support) for row in rows],
+    }
+    return report_key("item", data), data
+
+
+def _plan_source(plan: Plan) -> tuple[str, dict]:
+    # una versione di piano non cambia dopo la creazione
+    data = {"version": plan.version, "content_text": plan.content_text}
+    return report_key("plan", plan.id, plan.version), data
+
+
+def plan_source(db: Session, plan_id: int) -> tuple[str, dict]:
+    plan = db.query(Plan).filter(Plan.id == plan_id).first()
+    if not plan:
+        raise ReportNotFound("Piano non trovato.")
+    return _plan_source(plan)
+
+
+def active_plan_sources(db: Session, assessment_ids: list[int]) -> dict[int, tuple[int, str, dict]]:
+    plans = (
+        db.query(Plan)
+        .filter(Plan.assessment_id.in_(assessment_ids), Plan.is_active.is_(True))
+        .order_by(Plan.assessment_id, Plan.version.desc())
+        .all()
+    )
+    sources = {}
+    for plan in plans:
+        if plan.assessment_id not in sources:
+            sources[plan.assessment_id] = (plan.id, *_plan_source(plan))
+    return sources
+
+
+def render_assessment(data: dict) -> bytes:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    y = 800
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(40, y, "EduFAD - Report Assessment")
+    y -= 20
+    c.setFont("Helvetica", 10)
+
+    assessment_date, date_of_birth = data["assessment_date"], data["date_of_birth"]
+    age = assessment_date.year - date_of_birth.year - (
+        (assessment_date.month, assessment_date.day) < (date_of_birth.month, date_of_birth.day)
+    )
+    c.drawString(40, y, f"Profilo: {data['profile_name']} (DOB {date_of_birth}, età {age} anni)")
+    y -= 14
+    c.drawString(40, y, f"Data: {assessment_date} | Operatore: {data['operator_name']} ({data['operator_role']})")
+    y -= 14
+    c.drawString(40, y, f"Versione checklist: {data['checklist_version']}")
+    y -= 20
+
+    if data["summary"]:
+        c.drawString(40, y, "Sintesi:")
+        y -= 14
+        for line in data["summary"].split(". "):
+            c.drawString(50, y, line.strip())
+            y -= 12
+
+    y -= 10
+    c.drawString(40, y, "Risposte:")
+    y -= 14
+    for item_id, support, freq, gen in data["responses"]:
+        c.drawString(50, y, f"{item_id}: S{support} F{freq or '-'} G{gen or '-'}")
+        y -= 12
+        if y < 60:
+            c.showPage()
+            y = 800
+
+    c.setFont("Helvetica-Oblique", 8)
+    c.drawString(40, 30, DISCLAIMER)
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def render_item(data: dict) -> bytes:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    y = 800
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(40, y, f"EduFAD - Dashboard Item {data['item_id']}")
+    y -= 20
+    c.setFont("Helvetica", 10)
+    c.drawString(40, y, f"Esportato da: {data['exported_by']}")
+    y -= 14
+
+    for profile_name, assessment_date, support in data["rows"]:
+        c.drawString(40, y, f"{profile_name} - {assessment_date.isoformat()} - S{support}")
+        y -= 12
+        if y < 60:
+            c.showPage()
+            y = 800
+
+    c.setFont("Helvetica-Oblique", 8)
+    c.drawString(40, 30, DISCLAIMER)
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def render_plan(data: dict) -> bytes:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    y = 800
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(40, y, f"EduFAD - Piano Educativo v{data['version']}")
+    y -= 20
+    c.setFont("Helvetica", 10)
+
+    for line in (data["content_text"] or "").split("\n"):
+        c.drawString(40, y, line[:110])
+        y -= 12
+        if y < 60:
+            c.showPage()
+            y = 800
+
+    c.setFont("Helvetica-Oblique", 8)
+    c.drawString(40, 30, DISCLAIMER)
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+RENDERERS = {"assessment": render_assessment, "item": render_item, "plan": render_plan}
+
+
+def render_report(kind: str, data: dict) -> bytes:
+    # punto d'ingresso per il process pool: riceve solo dati, niente sessione DB
+    return RENDERERS[kind](data)
+
+
+@lru_cache
+def get_render_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=get_settings().render_workers)
+
+
+def shutdown_render_pool() -> None:
+    if get_render_pool.cache_info().currsize:
+        get_render_pool().shutdown(cancel_futures=True)
+        get_render_pool.cache_clear()
+
+
+def render_cached(kind: str, key: str, data: dict) -> bytes:
+    cache = get_pdf_cache()
+    content = cache.get(key)
+    if content is None:
+        content = RENDERERS[kind](data)
+        cache.put(key, content)
+    return content
+
+
+def assessment_pdf(db: Session, assessment_id: int) -> bytes:
+    return render_cached("assessment", *assessment_source(db, assessment_id))
+
+
+def item_pdf(db: Session, item_id: str, exported_by: str) -> bytes:
+    return render_cached("item", *item_source(db, item_id, exported_by))
+
+
+def plan_pdf(db: Session, plan_id: int) -> bytes:
+    return render_cached("plan", *plan_source(db, plan_id))
@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+import json
 from datetime import date, datetime
-from typing import List, Optional, Literal
+from typing import Any, List, Optional, Literal
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+from .checklist import CHECKLIST
+
+CHECKLIST_ITEMS = sum(len(area["items"]) for area in CHECKLIST["areas"])
 
 
 # =========================
@@ -39,6 +44,8 @@ class UserCreate(BaseModel):
     username: str = Field(..., min_length=1)
     password: str = Field(..., min_length=1)
     role: str = Field("editor")
+    # usato solo in aggiornamento: False disattiva l'utente
+    is_active: Optional[bool] = None
 
 
 # =========================
@@ -133,6 +140,11 @@ class ResponseCreate(BaseModel):
     note: Optional[str] = None
 
 
+class ResponseBulk(BaseModel):
+    # al massimo un valore per item della checklist
+    items: List[ResponseCreate] = Field(..., min_length=1, max_length=CHECKLIST_ITEMS)
+
+
 class ResponseOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
@@ -168,12 +180,18 @@ class PlanOut(BaseModel):
     id: int
     assessment_id: int
     version: int
-    content_json: Optional[dict] = None
+    # salvato come testo JSON (lista di aree con i relativi item)
+    content_json: Optional[Any] = None
     content_text: str
     is_active: bool = True
     generated_by_id: Optional[int] = None
     generated_at: Optional[datetime] = None
 
+    @field_validator("content_json", mode="before")
+    @classmethod
+    def _parse_content_json(cls, value):
+        return json.loads(value) if isinstance(value, str) else value
+
 
 # =========================
 # Work groups
@@ -230,6 +248,43 @@ class WorkGroupOut(BaseModel):
     assignees: List[int] = Field(default_factory=list)
 
 
+# =========================
+# Jobs
+# =========================
+JobKind = Literal["assessment_pdf", "item_pdf", "plan_pdf"]
+
+
+class JobCreate(BaseModel):
+    kind: JobKind
+    params: dict = Field(default_factory=dict)
+
+
+class JobOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    kind: str
+    params: dict
+    status: str
+    attempts: int
+    max_attempts: int
+    error: Optional[str] = None
+    artifact_name: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+# =========================
+# Exports
+# =========================
+class ReportsZipRequest(BaseModel):
+    profile_ids: Optional[List[int]] = None
+    group_id: Optional[int] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+
+
 # =========================
 # Audit (minimo)
 # =========================
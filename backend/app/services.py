@@ -1,4 +1,3 @@
-from collections import defaultdict
 from datetime import datetime
 import json
 
@@ -18,28 +17,39 @@ def build_area_map():
 AREA_MAP, ITEM_TO_AREA = build_area_map()
 
 
-def summarize_assessment(responses: list[dict]) -> str:
-    buckets = defaultdict(list)
+def area_stats(responses: list[dict]) -> dict[str, tuple[int, int, int]]:
+    # per area: (somma supporto, numero item, item con supporto <= 1)
+    stats: dict[str, tuple[int, int, int]] = {}
     for resp in responses:
         area_id = ITEM_TO_AREA.get(resp["item_id"])
         if area_id:
-            buckets[area_id].append(resp["support"])
+            total, count, low = stats.get(area_id, (0, 0, 0))
+            stats[area_id] = (total + resp["support"], count + 1, low + (1 if resp["support"] <= 1 else 0))
+    return stats
+
+
+def render_summary(stats: dict[str, tuple[int, int, int]]) -> str:
     lines = []
-    for area_id, supports in buckets.items():
-        area = AREA_MAP[area_id]["name"]
-        if supports:
-            avg = sum(supports) / len(supports)
-            low = sum(1 for s in supports if s <= 1)
+    for area_id, area in AREA_MAP.items():
+        if area_id not in stats:
+            continue
+        total, count, low = stats[area_id]
+        if count:
+            avg = total / count
             line = (
-                f"{area}: livello medio di supporto {avg:.1f}. "
-                f"Indicatori critici (supporto 0-1): {low} su {len(supports)}."
+                f"{area['name']}: livello medio di supporto {avg:.1f}. "
+                f"Indicatori critici (supporto 0-1): {low} su {count}."
             )
         else:
-            line = f"{area}: dati non disponibili."
+            line = f"{area['name']}: dati non disponibili."
         lines.append(line)
     return " ".join(lines)
 
 
+def summarize_assessment(responses: list[dict]) -> str:
+    return render_summary(area_stats(responses))
+
+
 def build_plan_content(responses: list[dict]) -> tuple[str, str]:
     plan = []
     for area in CHECKLIST["areas"]:
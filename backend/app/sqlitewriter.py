@@ -0,0 +1,215 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from fastapi import HTTPException
+from sqlalchemy import event
+
+from . import metrics
+from .config import get_settings
+from .database import ASYNC_MODE, AppSession, engine, get_engine, is_memory_sqlite, run_callbacks, sync_database_url
+
+
+# SQLITE_WRITER=true (solo SQLite sync, un processo): tutte le scritture passano da
+# un'unica connessione dedicata invece di contendersi il lock del database.
+# Ogni unità di lavoro gira in un SAVEPOINT dentro una transazione condivisa
+# (BEGIN IMMEDIATE); chi rilascia il writer senza altri in coda fa il COMMIT per
+# tutto il gruppo, quindi un solo fsync copre più richieste. Le richieste in
+# sola lettura restano sulle connessioni del pool (WAL).
+# Il coordinamento vale solo dentro il processo web: worker e comandi CLI sono
+# processi separati, scrivono dal proprio pool e attendono il lock del database
+# con busy_timeout (i gruppi durano al massimo SQLITE_WRITER_MAX_DELAY_MS).
+
+
+class GroupCommitError(RuntimeError):
+    pass
+
+
+class _Group:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.size = 0
+        self.done = threading.Event()
+        self.error: Exception | None = None
+
+
+class SQLiteWriter:
+    def __init__(self, writer_engine, max_queue: int, group_size: int, max_delay_seconds: float):
+        self.engine = writer_engine
+        self.max_queue = max_queue
+        self.group_size = group_size
+        self.max_delay_seconds = max_delay_seconds
+        self.connection = None
+        self._transaction = None
+        self._group: _Group | None = None
+        self._slot = threading.Lock()
+        self._state = threading.Lock()
+        self._waiting = 0
+
+    def acquire(self) -> _Group:
+        with self._state:
+            if self._waiting >= self.max_queue:
+                metrics.incr("sqlite_writer.rejected")
+                raise HTTPException(status_code=503, detail="Server occupato. Riprova.", headers={"Retry-After": "1"})
+            self._waiting += 1
+            metrics.set_gauge("sqlite_writer.queue", self._waiting)
+        started = time.monotonic()
+        self._slot.acquire()
+        metrics.observe("sqlite_writer.wait", time.monotonic() - started)
+        with self._state:
+            self._waiting -= 1
+            metrics.set_gauge("sqlite_writer.queue", self._waiting)
+        try:
+            if self.connection is None:
+                self.connection = self.engine.connect()
+            if self._transaction is None:
+                self._transaction = self.connection.begin()
+                self._group = _Group()
+        except Exception:
+            self._slot.release()
+            raise
+        self._group.size += 1
+        return self._group
+
+    def release(self, group: _Group, wait: bool = True) -> None:
+        # chiamato da chi detiene il writer, a savepoint già rilasciato o annullato
+        metrics.incr("sqlite_writer.transactions")
+        with self._state:
+            waiting = self._waiting
+        if waiting and group.size < self.group_size and time.monotonic() - group.started < self.max_delay_seconds:
+            # il prossimo in coda prosegue nella stessa transazione
+            self._slot.release()
+        else:
+            self._commit_group()
+        if wait:
+            group.done.wait()
+            if group.error is not None:
+                raise GroupCommitError("Commit di gruppo non riuscito.") from group.error
+
+    def _commit_group(self) -> None:
+        transaction, group = self._transaction, self._group
+        self._transaction = self._group = None
+        started = time.monotonic()
+        try:
+            transaction.commit()
+            metrics.incr("sqlite_writer.commits")
+            metrics.observe("sqlite_writer.commit", time.monotonic() - started)
+        except Exception as exc:
+            group.error = exc
+            # connessione in stato incerto: la prossima acquisizione ne apre una nuova
+            self.connection.invalidate()
+            self.connection = None
+        finally:
+            self._slot.release()
+            group.done.set()
+
+    @contextmanager
+    def transaction(self):
+        # connessione del writer in un savepoint; ritorna dopo il commit di gruppo
+        group = self.acquire()
+        try:
+            with self.connection.begin_nested():
+                yield self.connection
+        finally:
+            self.release(group)
+
+    def session(self, write: bool = False) -> "WriterSession":
+        return WriterSession(
+            bind=engine, writer=self, write=write, autoflush=False, join_transaction_mode="create_savepoint"
+        )
+
+
+class WriterSession(AppSession):
+    # write=True (richieste che scrivono): tutta l'unità di lavoro, letture
+    # comprese, gira sulla connessione del writer dalla prima query, così le
+    # decisioni prese leggendo non si basano su uno snapshot WAL superato.
+    # Altrimenti legge dal pool e passa al writer alla prima scrittura (flush o
+    # DML esplicito).
+    def __init__(self, *args, writer: SQLiteWriter, write: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.writer = writer
+        self.write = write
+        self._writer_group: _Group | None = None
+
+    def acquire_writer(self) -> None:
+        if self._writer_group is None:
+            self._writer_group = self.writer.acquire()
+
+    def get_bind(self, mapper=None, *, clause=None, **kw):
+        if self._writer_group is None and (self.write or getattr(clause, "is_dml", False)):
+            self.acquire_writer()
+        if self._writer_group is not None:
+            return self.writer.connection
+        return super().get_bind(mapper, clause=clause, **kw)
+
+    def commit(self) -> None:
+        # il flush prima di decidere: può essere lui a prendere il writer
+        self.flush()
+        if self._writer_group is None:
+            return super().commit()
+        # i callback after_commit partono solo quando il gruppo è durevole
+        callbacks = self.info.pop("after_commit", [])
+        super().commit()
+        # le letture successive (es. serializzazione della risposta) tornano al pool
+        self.write = False
+        self._release_writer(wait=True)
+        run_callbacks(callbacks)
+
+    def rollback(self) -> None:
+        try:
+            super().rollback()
+        finally:
+            self._release_writer(wait=False)
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            self._release_writer(wait=False)
+
+    def _release_writer(self, wait: bool) -> None:
+        group, self._writer_group = self._writer_group, None
+        if group is not None:
+            self.writer.release(group, wait=wait)
+
+
+@event.listens_for(WriterSession, "before_flush")
+def _acquire_for_flush(session, flush_context, instances):
+    session.acquire_writer()
+
+
+def create_writer_engine(url: str):
+    writer_engine = get_engine(url)
+
+    # transazioni gestite da SQLAlchemy (il driver non apre BEGIN da solo, così i
+    # SAVEPOINT funzionano) e lock di scrittura preso subito
+    @event.listens_for(writer_engine, "connect")
+    def _driver_autocommit(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(writer_engine, "begin")
+    def _begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return writer_engine
+
+
+@lru_cache
+def get_sqlite_writer() -> SQLiteWriter | None:
+    settings = get_settings()
+    url = sync_database_url(settings.database_url)
+    if not settings.sqlite_writer or ASYNC_MODE or not url.startswith("sqlite") or is_memory_sqlite(url):
+        return None
+    return SQLiteWriter(
+        create_writer_engine(url),
+        settings.sqlite_writer_max_queue,
+        settings.sqlite_writer_group_size,
+        settings.sqlite_writer_max_delay_ms / 1000,
+    )
+
+
+def write_transaction():
+    # per le scritture fuori da una sessione (es. audit in batch)
+    writer = get_sqlite_writer()
+    return writer.transaction() if writer is not None else engine.begin()
@@ -0,0 +1,93 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+from pathlib import Path
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from .compression import accepted_encodings, brotli
+
+
+# Asset statici preparati in fase di build (python -m app.cli build-static):
+# JS e CSS copiati con l'hash del contenuto nel nome, riferimenti in index.html
+# aggiornati, varianti .br/.gz accanto agli originali. PrecompressedStaticFiles
+# serve la variante accettata dal client senza comprimere a ogni richiesta.
+
+STATIC_SOURCE_DIR = Path(__file__).resolve().parents[1] / "static"
+STATIC_BUILD_DIR = Path(__file__).resolve().parents[1] / "static_dist"
+
+HASHED_TYPES = (".js", ".css")
+COMPRESSED_TYPES = (".html", ".js", ".css", ".json", ".svg", ".txt")
+HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.[a-z0-9]+$")
+# varianti in ordine di preferenza: (Content-Encoding, suffisso)
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+
+def hashed_name(path: Path) -> str:
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()[:12]
+    return f"{path.stem}.{digest}{path.suffix}"
+
+
+def build_static(source: Path = STATIC_SOURCE_DIR, target: Path = STATIC_BUILD_DIR) -> dict[str, str]:
+    # ricrea target da zero; restituisce il manifest nome originale -> nome con hash
+    if target.exists():
+        shutil.rmtree(target)
+    shutil.copytree(source, target)
+
+    manifest = {}
+    for path in sorted(target.rglob("*")):
+        if path.is_file() and path.suffix in HASHED_TYPES:
+            name = hashed_name(path)
+            shutil.copy2(path, path.with_name(name))
+            manifest[path.relative_to(target).as_posix()] = path.relative_to(target).with_name(name).as_posix()
+
+    for page in target.rglob("*.html"):
+        html = page.read_text(encoding="utf-8")
+        for original, hashed in manifest.items():
+            html = re.sub(rf'(\b(?:href|src)=")/{re.escape(original)}"', rf'\g<1>/{hashed}"', html)
+        page.write_text(html, encoding="utf-8")
+
+    (target / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    for path in list(target.rglob("*")):
+        if path.is_file() and path.suffix in COMPRESSED_TYPES:
+            data = path.read_bytes()
+            # mtime=0: output riproducibile tra una build e l'altra
+            path.with_name(path.name + ".gz").write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                path.with_name(path.name + ".br").write_bytes(brotli.compress(data, quality=11))
+    return manifest
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        full_path = os.fspath(full_path)
+        name = os.path.basename(full_path)
+        media_type = mimetypes.guess_type(name)[0] or "text/plain"
+        headers = {
+            "Cache-Control": IMMUTABLE_CACHE if HASHED_NAME.search(name) else "no-cache",
+            "Vary": "Accept-Encoding",
+        }
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        for encoding, suffix in PRECOMPRESSED:
+            if encoding in accepted and os.path.isfile(full_path + suffix):
+                full_path = full_path + suffix
+                stat_result = os.stat(full_path)
+                headers["Content-Encoding"] = encoding
+                break
+
+        response = FileResponse(
+            full_path, status_code=status_code, stat_result=stat_result, media_type=media_type, headers=headers
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,101 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from .database import AppSession
+from .models import TableVersion
+
+
+# GET condizionali per le liste che la SPA ricarica spesso. Ogni modifica a una
+# tabella in TRACKED_TABLES (flush ORM o UPDATE/DELETE in blocco) incrementa il
+# suo contatore in table_versions; l'ETag deriva dai contatori, quindi
+# If-None-Match costa una lettura per chiave primaria invece della query.
+# L'incremento avviene nella transazione della modifica, subito prima del commit:
+# ETag e dati cambiano insieme. Il lock sulla riga del contatore dura solo il commit.
+
+TRACKED_TABLES = ("profiles", "assessments")
+
+
+def _mark_changed(session: Session, tables: set[str]) -> None:
+    tables &= set(TRACKED_TABLES)
+    if tables:
+        session.info.setdefault("changed_tables", set()).update(tables)
+
+
+@event.listens_for(AppSession, "after_flush")
+def _track_flush(session, flush_context):
+    _mark_changed(session, {obj.__table__.name for obj in (*session.new, *session.dirty, *session.deleted)})
+
+
+@event.listens_for(AppSession, "do_orm_execute")
+def _track_bulk(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None:
+            _mark_changed(orm_execute_state.session, {table.name})
+
+
+@event.listens_for(AppSession, "before_commit")
+def _bump_on_commit(session):
+    # il flush qui: le modifiche ancora in sospeso devono essere marcate prima dell'incremento
+    session.flush()
+    tables = session.info.pop("changed_tables", None)
+    if tables:
+        bump_versions(session.connection(), tables)
+
+
+@event.listens_for(AppSession, "after_rollback")
+def _discard_changed(session):
+    session.info.pop("changed_tables", None)
+
+
+def bump_versions(conn, tables: set[str]) -> None:
+    conn.execute(
+        update(TableVersion)
+        .where(TableVersion.name.in_(sorted(tables)))
+        .values(version=TableVersion.version + 1, updated_at=datetime.now(timezone.utc))
+    )
+
+
+def ensure_versions(db: Session) -> None:
+    # database creati con create_all invece che con le migrazioni
+    existing = {name for (name,) in db.query(TableVersion.name)}
+    for name in TRACKED_TABLES:
+        if name not in existing:
+            db.add(TableVersion(name=name, version=0, updated_at=datetime.now(timezone.utc)))
+
+
+def conditional_get(request: Request, response: Response, db: Session, tables: tuple[str, ...], user) -> Response | None:
+    # imposta ETag/Last-Modified su response; se il client è aggiornato restituisce il 304
+    rows = db.query(TableVersion.name, TableVersion.version, TableVersion.updated_at).filter(TableVersion.name.in_(tables)).all()
+    state = sorted((row.name, row.version) for row in rows)
+    # la stessa URL può restituire righe diverse a utenti diversi (es. include_deleted)
+    tag = hashlib.sha256(json.dumps([state, request.url.query, user.id, user.role]).encode()).hexdigest()[:32]
+    headers = {"ETag": f'W/"{tag}"', "Cache-Control": "private, no-cache"}
+    modified = max((row.updated_at for row in rows), default=None)
+    if modified is not None:
+        modified = modified.replace(tzinfo=modified.tzinfo or timezone.utc, microsecond=0)
+        headers["Last-Modified"] = format_datetime(modified, usegmt=True)
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        fresh = if_none_match.strip() == "*" or headers["ETag"] in if_none_match
+    else:
+        fresh = modified is not None and _not_modified_since(request.headers.get("if-modified-since"), modified)
+    return Response(status_code=304, headers=headers) if fresh else None
+
+
+def _not_modified_since(value: str | None, modified: datetime) -> bool:
+    if not value:
+        return False
+    try:
+        since = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return False
+    return since.tzinfo is not None and modified <= since
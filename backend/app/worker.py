@@ -0,0 +1,103 @@
+"""Worker per i job in background.
+
+Uso (dalla cartella backend):
+    python -m app.worker [--concurrency N]
+"""
+
+import argparse
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .config import get_settings
+from .database import SessionLocal, engine
+from .jobs import claim_next_job, release_job, requeue_stale_jobs, run_job
+
+
+logger = logging.getLogger("edufad.worker")
+
+
+def _init_process() -> None:
+    # le connessioni ereditate dal processo padre non vanno riusate
+    engine.dispose(close=False)
+
+
+CRASHED = "Processo del worker terminato durante l'esecuzione."
+
+
+def run_worker(concurrency: int, poll_seconds: float, once: bool = False) -> None:
+    db = SessionLocal()
+    pool = ProcessPoolExecutor(max_workers=concurrency, initializer=_init_process)
+    in_flight = {}
+    try:
+        while True:
+            # a ogni giro: i job di un worker caduto tornano in coda appena scaduti
+            requeued = requeue_stale_jobs(db)
+            if requeued:
+                logger.warning("Rimessi in coda %s job bloccati.", requeued)
+
+            broken = False
+            for future, job_id in list(in_flight.items()):
+                if future.done():
+                    del in_flight[future]
+                    broken |= _finished(db, future, job_id)
+
+            while not broken and len(in_flight) < concurrency:
+                job_id = claim_next_job(db)
+                if job_id is None:
+                    break
+                try:
+                    in_flight[pool.submit(run_job, job_id)] = job_id
+                except BrokenProcessPool:
+                    logger.error("Job %s: %s", job_id, release_job(db, job_id, CRASHED))
+                    broken = True
+
+            if broken:
+                # un processo figlio è morto: il pool è inutilizzabile e tutti i
+                # job ancora assegnati falliscono con BrokenProcessPool
+                pool.shutdown(wait=True)
+                for future, job_id in in_flight.items():
+                    _finished(db, future, job_id)
+                in_flight.clear()
+                pool = ProcessPoolExecutor(max_workers=concurrency, initializer=_init_process)
+                continue
+
+            if once and not in_flight:
+                return
+            time.sleep(poll_seconds)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        db.close()
+
+
+def _finished(db, future, job_id: int) -> bool:
+    # registra l'esito di un job; True se il pool risulta rotto
+    exc = future.exception()
+    if isinstance(exc, BrokenProcessPool):
+        logger.error("Job %s interrotto, processo terminato: %s", job_id, release_job(db, job_id, CRASHED))
+        return True
+    if exc is not None:
+        logger.error("Job %s terminato con errore: %s", job_id, exc)
+    else:
+        logger.info("Job %s: %s", job_id, future.result())
+    return False
+
+
+def main(argv: list[str] | None = None) -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(prog="python -m app.worker")
+    parser.add_argument("--concurrency", type=int, default=settings.jobs_concurrency)
+    parser.add_argument("--once", action="store_true", help="Esce quando la coda è vuota.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)-5.5s [%(name)s] %(message)s")
+    logger.info("Worker avviato (concorrenza %s).", args.concurrency)
+    try:
+        run_worker(args.concurrency, settings.jobs_poll_seconds, once=args.once)
+    except KeyboardInterrupt:
+        logger.info("Worker arrestato.")
+
+
+if __name__ == "__main__":
+    main()
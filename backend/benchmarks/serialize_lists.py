@@ -0,0 +1,113 @@
+"""Confronto serializzazione liste: response_model (ORM + from_attributes) contro fastjson.
+
+Uso (da backend/):
+    python -m benchmarks.serialize_lists [--rows 10000] [--repeat 5]
+
+Crea un database SQLite in memoria con N assessment e misura, per ogni percorso,
+il tempo per query + serializzazione JSON di tutte le righe.
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import fastjson  # noqa: E402
+from app.database import Base  # noqa: E402
+from app.models import Assessment, Profile, User  # noqa: E402
+from app.schemas import AssessmentOut  # noqa: E402
+
+
+def seed(db, rows: int) -> None:
+    db.add(User(id=1, username="bench", password_hash="-", role="admin"))
+    db.add(Profile(id=1, code="B01", display_name="Bench", date_of_birth=date(2010, 1, 1)))
+    start = date(2020, 1, 1)
+    now = datetime(2024, 1, 1, 12, 30)
+    db.bulk_insert_mappings(
+        Assessment,
+        [
+            {
+                "profile_id": 1,
+                "assessment_date": start + timedelta(days=i % 1500),
+                "status": "finalized" if i % 3 else "draft",
+                "operator_name": f"Operatore {i % 40}",
+                "operator_role": "Educatore",
+                "present_user_ids": [1],
+                "session_notes": "Note della sessione " * 3,
+                "created_by_id": 1,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for i in range(rows)
+        ],
+    )
+    db.commit()
+
+
+def response_model_path(db) -> bytes:
+    # come FastAPI con response_model=list[AssessmentOut]: validazione da attributi,
+    # dump in modalità json, poi json.dumps di JSONResponse
+    adapter = TypeAdapter(list[AssessmentOut])
+    objects = db.query(Assessment).order_by(Assessment.id).all()
+    content = adapter.dump_python(adapter.validate_python(objects, from_attributes=True), mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(serializer):
+    def run(db) -> bytes:
+        return serializer.dumps(serializer.query(db).order_by(Assessment.id).all())
+
+    return run
+
+
+def measure(label: str, fn, Session, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        db = Session()
+        try:
+            started = time.perf_counter()
+            fn(db)
+            timings.append(time.perf_counter() - started)
+        finally:
+            db.close()
+    best = min(timings) * 1000
+    print(f"{label:<32} {best:9.1f} ms (migliore di {repeat})")
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", future=True)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, future=True)
+    db = Session()
+    seed(db, args.rows)
+    db.close()
+
+    serializer = fastjson.RowSerializer(AssessmentOut, Assessment)
+    print(f"{args.rows} assessment")
+    baseline = measure("response_model (ORM)", response_model_path, Session, args.repeat)
+    if fastjson.orjson is not None:
+        fast = measure("fastjson (orjson)", fast_path(serializer), Session, args.repeat)
+        print(f"{'':<32} {baseline / fast:9.1f}x")
+    orjson, fastjson.orjson = fastjson.orjson, None
+    try:
+        fast = measure("fastjson (TypeAdapter)", fast_path(serializer), Session, args.repeat)
+        print(f"{'':<32} {baseline / fast:9.1f}x")
+    finally:
+        fastjson.orjson = orjson
+
+
+if __name__ == "__main__":
+    main()
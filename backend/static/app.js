@@ -49,6 +49,7 @@ function avgSupportFromResponses(responses){
 ------------------------- */
 
 async function api(path, options = {}){
+  const { raw, ...fetchOptions } = options;
   const headers = options.headers ? { ...options.headers } : {};
 
   if (state.token) headers["Authorization"] = `Bearer ${state.token}`;
@@ -58,7 +59,7 @@ async function api(path, options = {}){
   const isForm = headers["Content-Type"] === "application/x-www-form-urlencoded";
   if (hasBody && !isForm && !headers["Content-Type"]) headers["Content-Type"] = "application/json";
 
-  const res = await fetch(path, { ...options, headers });
+  const res = await fetch(path, { ...fetchOptions, headers });
 
   if (!res.ok){
     let detail = "Errore inatteso.";
@@ -69,11 +70,27 @@ async function api(path, options = {}){
     throw new Error(detail);
   }
 
+  if (raw) return res;
+
   const ct = res.headers.get("content-type") || "";
   if (ct.includes("application/json")) return res.json();
   return res;
 }
 
+// liste paginate: segue X-Next-Cursor fino all'ultima pagina
+async function apiAll(path){
+  const items = [];
+  let cursor = null;
+  do {
+    const sep = path.includes("?") ? "&" : "?";
+    const url = cursor ? `${path}${sep}cursor=${encodeURIComponent(cursor)}` : path;
+    const res = await api(url, { raw: true });
+    items.push(...await res.json());
+    cursor = res.headers.get("X-Next-Cursor");
+  } while (cursor);
+  return items;
+}
+
 /* -------------------------
    Disclaimer + Login Gate
 ------------------------- */
@@ -317,12 +334,12 @@ async function loadChecklist(){
 }
 
 async function loadProfiles(){
-  state.profiles = await api("/api/profiles");
+  state.profiles = await apiAll("/api/profiles?limit=500");
   renderProfileList();
 }
 
 async function loadAssessments(){
-  state.assessments = await api("/api/assessments");
+  state.assessments = await apiAll("/api/assessments?limit=500");
 }
 
 /* -------------------------
@@ -330,6 +347,7 @@ async function loadAssessments(){
 ------------------------- */
 
 async function selectProfile(profileId){
+  await flushResponses();
   state.currentProfileId = profileId;
   renderProfileList();
 
@@ -392,6 +410,7 @@ async function createAssessmentForCurrentProfile(){
 }
 
 async function openAssessment(assessmentId){
+  await flushResponses();
   state.currentAssessmentId = assessmentId;
 
   // carica assessment + responses
@@ -650,9 +669,31 @@ async function saveResponseField(assessmentId, itemId, field, value){
   // normalizza
   if (payload.support == null || Number.isNaN(payload.support)) payload.support = 0;
 
-  await api(`/api/assessments/${assessmentId}/responses`, {
+  // accoda: le modifiche ravvicinate partono in un'unica POST /responses/bulk
+  if (pendingSave.assessmentId !== assessmentId) await flushResponses();
+  pendingSave.assessmentId = assessmentId;
+  pendingSave.items.set(itemId, payload);
+  clearTimeout(pendingSave.timer);
+  pendingSave.timer = setTimeout(() => { flushResponses().catch(err => toast(err.message)); }, SAVE_DEBOUNCE_MS);
+}
+
+const SAVE_DEBOUNCE_MS = 600;
+const pendingSave = { assessmentId: null, items: new Map(), timer: null };
+
+async function flushResponses({ keepalive = false } = {}){
+  clearTimeout(pendingSave.timer);
+  pendingSave.timer = null;
+  if (!pendingSave.items.size) return;
+
+  const assessmentId = pendingSave.assessmentId;
+  const items = Array.from(pendingSave.items.values());
+  pendingSave.items.clear();
+
+  await api(`/api/assessments/${assessmentId}/responses/bulk`, {
     method: "POST",
-    body: JSON.stringify(payload),
+    body: JSON.stringify({ items }),
+    // keepalive: la richiesta sopravvive alla chiusura della pagina (sendBeacon non invia l'header Authorization)
+    keepalive,
   });
 
   toast("Salvato.");
@@ -675,6 +716,7 @@ async function login(username, password){
 }
 
 function logout(){
+  flushResponses().catch(() => {});
   state.token = null;
   state.user = null;
   localStorage.removeItem(LS_TOKEN_KEY);
@@ -748,7 +790,8 @@ document.addEventListener("DOMContentLoaded", async () => {
       const profile = state.profiles.find(p => p.id === state.currentProfileId);
       const data = {
         profile,
-        assessments: state.assessments.filter(a => a.profile_id === state.currentProfileId),
+        // la lista in memoria è la proiezione di riepilogo: per l'export servono tutti i campi
+        assessments: await apiAll(`/api/assessments?profile_id=${state.currentProfileId}&fields=all&limit=500`),
       };
       const blob = new Blob([JSON.stringify(data, null, 2)], { type:"application/json" });
       const url = URL.createObjectURL(blob);
@@ -761,6 +804,9 @@ document.addEventListener("DOMContentLoaded", async () => {
 
   $("btnLogout")?.addEventListener("click", logout);
 
+  // salva le modifiche ancora in coda se la pagina viene chiusa
+  window.addEventListener("pagehide", () => { flushResponses({ keepalive: true }).catch(() => {}); });
+
   // login submit
   $("login-form")?.addEventListener("submit", async (e) => {
     e.preventDefault();
@@ -13,10 +13,35 @@ def client(tmp_path_factory):
     os.environ["SECRET_KEY"] = "test-secret"
     os.environ["ADMIN_USERNAME"] = "admin"
     os.environ["ADMIN_PASSWORD"] = "admin123"
+    os.environ["JOBS_ARTIFACT_DIR"] = str(tmp_path_factory.mktemp("artifacts"))
+    os.environ["PDF_CACHE_DIR"] = str(tmp_path_factory.mktemp("pdf-cache"))
+    os.environ["AUDIT_ARCHIVE_DIR"] = str(tmp_path_factory.mktemp("audit-archive"))
     sys.path.append(str(Path(__file__).resolve().parents[1]))
     from app.main import app
 
-    return TestClient(app)
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def count_queries(fn):
+    from sqlalchemy import event
+
+    from app.audit import flush_audit
+    from app.database import engine
+
+    # buffer audit vuoto: il thread di scrittura non deve inserire durante la misura
+    flush_audit()
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return len(statements)
 
 
 def login(client, username="admin", password="admin123"):
@@ -80,3 +105,1154 @@ def test_soft_delete_and_dashboard(client):
     assert assessment["id"] not in [a["id"] for a in listed]
     admin_list = client.get("/api/assessments?include_deleted=true", headers=admin_headers).json()
     assert assessment["id"] in [a["id"] for a in admin_list]
+
+
+def test_bulk_responses_upsert(client):
+    from app.schemas import CHECKLIST_ITEMS
+
+    admin_headers = login(client)
+    profile = client.post(
+        "/api/profiles",
+        json={"code": "P03", "display_name": "Studente Tre", "date_of_birth": "2011-03-03"},
+        headers=admin_headers,
+    ).json()
+    assessment = client.post(
+        "/api/assessments",
+        json={
+            "profile_id": profile["id"],
+            "assessment_date": "2024-03-01",
+            "operator_name": "Operatore",
+            "operator_role": "Educatore",
+        },
+        headers=admin_headers,
+    ).json()
+    url = f"/api/assessments/{assessment['id']}/responses/bulk"
+    response = client.post(
+        url,
+        json={"items": [{"item_id": "AP01", "support": 0}, {"item_id": "AP02", "support": 3, "freq": "F1"}]},
+        headers=admin_headers,
+    )
+    assert response.status_code == 200
+    assert {r["item_id"]: r["support"] for r in response.json()} == {"AP01": 0, "AP02": 3}
+
+    response = client.post(
+        url,
+        json={"items": [{"item_id": "AP02", "support": 1}, {"item_id": "GT01", "support": 2}]},
+        headers=admin_headers,
+    )
+    assert response.status_code == 200
+    stored = client.get(f"/api/assessments/{assessment['id']}/responses", headers=admin_headers).json()
+    assert {r["item_id"]: r["support"] for r in stored} == {"AP01": 0, "AP02": 1, "GT01": 2}
+    assert next(r for r in stored if r["item_id"] == "AP02")["freq"] is None
+
+    summary = client.get(f"/api/assessments/{assessment['id']}/summary", headers=admin_headers).json()
+    assert "Indicatori critici (supporto 0-1): 2 su 2" in summary["auto_text"]
+
+    # item sconosciuti e batch più lunghi della checklist vengono rifiutati
+    response = client.post(url, json={"items": [{"item_id": "XX99", "support": 1}]}, headers=admin_headers)
+    assert response.status_code == 400
+    too_many = [{"item_id": "AP01", "support": 1}] * (CHECKLIST_ITEMS + 1)
+    assert client.post(url, json={"items": too_many}, headers=admin_headers).status_code == 422
+    single = client.post(url.removesuffix("/bulk"), json={"item_id": "XX99", "support": 1}, headers=admin_headers)
+    assert single.status_code == 400
+
+
+def test_area_scores_stay_consistent(client):
+    admin_headers = login(client)
+    assessments = client.get("/api/assessments", headers=admin_headers).json()
+    assessment_id = assessments[0]["id"]
+    url = f"/api/assessments/{assessment_id}/responses"
+    client.post(url, json={"item_id": "GT02", "support": 3}, headers=admin_headers)
+    client.post(url, json={"item_id": "GT02", "support": 0}, headers=admin_headers)
+
+    # salvataggi concorrenti dello stesso item e di item della stessa area
+    from concurrent.futures import ThreadPoolExecutor
+
+    payloads = [{"item_id": "AP04" if n % 2 else "AP03", "support": n % 3} for n in range(20)]
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        statuses = list(pool.map(lambda payload: client.post(url, json=payload, headers=admin_headers).status_code, payloads))
+    assert statuses == [200] * 20
+
+    check = client.post(f"/api/admin/area-scores/check?assessment_id={assessment_id}", headers=admin_headers).json()
+    assert check["drifted"] == []
+    summary = client.get(f"/api/assessments/{assessment_id}/summary", headers=admin_headers).json()
+    assert "Gestione del tempo" in summary["auto_text"]
+
+
+def test_profile_dashboard_reads_area_scores(client):
+    admin_headers = login(client)
+    profile = client.post(
+        "/api/profiles",
+        json={"code": "P04", "display_name": "Studente Quattro", "date_of_birth": "2011-04-04"},
+        headers=admin_headers,
+    ).json()
+    assessment = client.post(
+        "/api/assessments",
+        json={
+            "profile_id": profile["id"],
+            "assessment_date": "2024-04-01",
+            "operator_name": "Operatore",
+            "operator_role": "Educatore",
+        },
+        headers=admin_headers,
+    ).json()
+    client.post(
+        f"/api/assessments/{assessment['id']}/responses/bulk",
+        json={"items": [{"item_id": "AP01", "support": 1}, {"item_id": "AP02", "support": 2}]},
+        headers=admin_headers,
+    )
+    url = f"/api/dashboard/profile/{profile['id']}"
+    assert client.get(url, headers=admin_headers).json()["series"] == []
+
+    client.patch(f"/api/assessments/{assessment['id']}", json={"status": "finalized"}, headers=admin_headers)
+    series = client.get(url, headers=admin_headers).json()["series"]
+    assert series == [{"assessment_id": assessment["id"], "date": "2024-04-01", "areas": {"AP": 1.5}}]
+
+    client.delete(f"/api/assessments/{assessment['id']}", headers=admin_headers)
+    assert client.get(url, headers=admin_headers).json()["series"] == []
+
+
+def test_dashboard_item_query_count_is_constant(client):
+    admin_headers = login(client)
+
+    def add_profile_with_item(n):
+        profile = client.post(
+            "/api/profiles",
+            json={"code": f"Q{n:02d}", "display_name": f"Studente Q{n}", "date_of_birth": "2010-01-01"},
+            headers=admin_headers,
+        ).json()
+        assessment = client.post(
+            "/api/assessments",
+            json={
+                "profile_id": profile["id"],
+                "assessment_date": "2024-05-01",
+                "operator_name": "Operatore",
+                "operator_role": "Educatore",
+                "status": "finalized",
+            },
+            headers=admin_headers,
+        ).json()
+        client.post(
+            f"/api/assessments/{assessment['id']}/responses",
+            json={"item_id": "AP03", "support": 0},
+            headers=admin_headers,
+        )
+
+    def fetch():
+        response = client.get("/api/dashboard/item/AP03", headers=admin_headers)
+        assert response.status_code == 200
+        results.append(len(response.json()["results"]))
+
+    results = []
+    add_profile_with_item(1)
+    baseline = count_queries(fetch)
+    for n in range(2, 6):
+        add_profile_with_item(n)
+    assert count_queries(fetch) == baseline
+    assert results == [1, 5]
+
+
+def test_latest_assessment_pointer_follows_soft_delete(client):
+    admin_headers = login(client)
+    profile = client.post(
+        "/api/profiles",
+        json={"code": "P05", "display_name": "Studente Cinque", "date_of_birth": "2011-05-05"},
+        headers=admin_headers,
+    ).json()
+    ids = []
+    for assessment_date, support in (("2024-01-10", 0), ("2024-06-10", 1)):
+        assessment = client.post(
+            "/api/assessments",
+            json={
+                "profile_id": profile["id"],
+                "assessment_date": assessment_date,
+                "operator_name": "Operatore",
+                "operator_role": "Educatore",
+                "status": "finalized",
+            },
+            headers=admin_headers,
+        ).json()
+        client.post(
+            f"/api/assessments/{assessment['id']}/responses",
+            json={"item_id": "GD01", "support": support},
+            headers=admin_headers,
+        )
+        ids.append(assessment["id"])
+
+    def latest_date():
+        results = client.get("/api/dashboard/item/GD01", headers=admin_headers).json()["results"]
+        return [r["assessment_date"] for r in results if r["profile_id"] == profile["id"]]
+
+    assert latest_date() == ["2024-06-10"]
+    client.delete(f"/api/assessments/{ids[1]}", headers=admin_headers)
+    assert latest_date() == ["2024-01-10"]
+    client.post(f"/api/assessments/{ids[1]}/restore", headers=admin_headers)
+    assert latest_date() == ["2024-06-10"]
+
+
+def test_keyset_pagination(client):
+    admin_headers = login(client)
+    seen = []
+    cursor = None
+    while True:
+        url = "/api/profiles?limit=2" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url, headers=admin_headers)
+        assert response.status_code == 200
+        assert len(response.json()) <= 2
+        seen.extend(p["id"] for p in response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    full = client.get("/api/profiles", headers=admin_headers).json()
+    assert seen == [p["id"] for p in full]
+
+    page = client.get("/api/assessments?limit=1&status=finalized&date_from=2024-05-01", headers=admin_headers)
+    assert all(a["assessment_date"] >= "2024-05-01" for a in page.json())
+    cursor = page.headers["x-next-cursor"]
+    next_page = client.get(f"/api/assessments?limit=1&status=finalized&date_from=2024-05-01&cursor={cursor}", headers=admin_headers)
+    assert next_page.json()[0]["id"] != page.json()[0]["id"]
+    assert client.get("/api/assessments?cursor=not-a-cursor", headers=admin_headers).status_code == 400
+
+
+def test_csv_exports_stream(client):
+    admin_headers = login(client)
+    response = client.get("/api/exports/assessments.csv", headers=admin_headers)
+    assert response.status_code == 200
+    lines = response.text.strip().splitlines()
+    assert lines[0] == "id,profile_id,assessment_date,status,operator_name,operator_role"
+    assert len(lines) > 1
+
+    response = client.get("/api/exports/item/AP03.csv", headers=admin_headers)
+    assert response.status_code == 200
+    lines = response.text.strip().splitlines()
+    assert lines[0] == "profile_id,profile_name,assessment_date,support,freq,gen"
+    assert len(lines) == 6
+
+
+def test_response_export_resumes_from_cursor(client):
+    import json
+
+    admin_headers = login(client)
+    response = client.get("/api/exports/responses.ndjson", headers=admin_headers)
+    assert response.status_code == 200
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert len(records) > 3
+    assert {"item_id", "support", "freq", "gen", "area_id", "cursor"} <= set(records[0])
+
+    resumed = client.get(f"/api/exports/responses.ndjson?cursor={records[1]['cursor']}", headers=admin_headers)
+    assert [json.loads(line)["response_id"] for line in resumed.text.splitlines()] == [r["response_id"] for r in records[2:]]
+
+    csv_export = client.get("/api/exports/responses.csv?updated_since=2000-01-01T00:00:00Z", headers=admin_headers)
+    assert len(csv_export.text.strip().splitlines()) == len(records) + 1
+    future = client.get("/api/exports/responses.ndjson?updated_since=2999-01-01T00:00:00", headers=admin_headers)
+    assert future.text == ""
+
+    # il delta include le righe il cui assessment è cambiato dopo updated_since
+    import time
+    from datetime import datetime, timezone
+
+    assert "context" not in records[0]
+    since = datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+    time.sleep(1.1)  # SQLite salva updated_at al secondo
+    assessment_id = records[0]["assessment_id"]
+    client.patch(f"/api/assessments/{assessment_id}", json={"operator_name": "Nuovo operatore"}, headers=admin_headers)
+    delta = client.get(f"/api/exports/responses.ndjson?updated_since={since}", headers=admin_headers)
+    changed = [json.loads(line) for line in delta.text.splitlines()]
+    assert changed and {row["assessment_id"] for row in changed} == {assessment_id}
+    assert {row["operator_name"] for row in changed} == {"Nuovo operatore"}
+
+
+def test_pdf_job_lifecycle(client):
+    from app.worker import run_worker
+
+    admin_headers = login(client)
+    assessment_id = client.get("/api/assessments", headers=admin_headers).json()[0]["id"]
+    response = client.post(
+        "/api/jobs",
+        json={"kind": "assessment_pdf", "params": {"assessment_id": assessment_id}},
+        headers=admin_headers,
+    )
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] == "queued"
+    assert client.get(f"/api/jobs/{job['id']}/artifact", headers=admin_headers).status_code == 409
+    assert client.post("/api/jobs", json={"kind": "plan_pdf", "params": {}}, headers=admin_headers).status_code == 422
+
+    run_worker(concurrency=1, poll_seconds=0.05, once=True)
+
+    job = client.get(f"/api/jobs/{job['id']}", headers=admin_headers).json()
+    assert job["status"] == "done"
+    artifact = client.get(f"/api/jobs/{job['id']}/artifact", headers=admin_headers)
+    assert artifact.status_code == 200
+    assert artifact.content.startswith(b"%PDF")
+
+
+def test_stale_jobs_stop_at_max_attempts(client):
+    from datetime import datetime, timedelta
+
+    from app.database import SessionLocal
+    from app.jobs import STALE_AFTER, claim_next_job, requeue_stale_jobs
+    from app.models import Job, User
+
+    db = SessionLocal()
+    try:
+        started = datetime.utcnow() - STALE_AFTER - timedelta(minutes=1)
+        job = {"kind": "plan_pdf", "params": {"plan_id": 1}, "max_attempts": 3, "created_by_id": db.query(User.id).first().id}
+        exhausted = Job(status="running", attempts=3, started_at=started, **job)
+        retry = Job(status="running", attempts=1, started_at=started, **job)
+        spent = Job(status="queued", attempts=3, **job)
+        db.add_all([exhausted, retry, spent])
+        db.commit()
+
+        assert requeue_stale_jobs(db) == 1
+        db.refresh(exhausted)
+        db.refresh(retry)
+        assert exhausted.status == "failed" and exhausted.finished_at is not None
+        assert retry.status == "queued"
+        assert claim_next_job(db) == retry.id
+        assert claim_next_job(db) is None
+        db.refresh(spent)
+        assert spent.status == "queued" and spent.attempts == 3
+    finally:
+        db.close()
+
+
+def test_worker_survives_a_crashed_child_process(client, monkeypatch):
+    import os
+
+    from app import worker
+    from app.database import SessionLocal
+    from app.models import Job, User
+
+    db = SessionLocal()
+    try:
+        job = Job(
+            kind="plan_pdf",
+            params={"plan_id": 1},
+            status="queued",
+            attempts=0,
+            max_attempts=2,
+            created_by_id=db.query(User.id).first().id,
+        )
+        db.add(job)
+        db.commit()
+
+        # il processo figlio esce subito: il pool diventa BrokenProcessPool
+        monkeypatch.setattr(worker, "run_job", os._exit)
+        worker.run_worker(concurrency=1, poll_seconds=0.05, once=True)
+        db.refresh(job)
+        assert job.status == "queued" and job.attempts == 1 and job.run_after is not None
+        assert job.error == worker.CRASHED
+
+        job.run_after = None
+        db.commit()
+        worker.run_worker(concurrency=1, poll_seconds=0.05, once=True)
+        db.refresh(job)
+        assert job.status == "failed" and job.attempts == 2
+    finally:
+        db.close()
+
+
+def test_pdf_export_cache_and_etag(client):
+    admin_headers = login(client)
+    assessment_id = client.get("/api/assessments", headers=admin_headers).json()[0]["id"]
+    url = f"/api/exports/assessment/{assessment_id}.pdf"
+
+    first = client.get(url, headers=admin_headers)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    hits = client.get("/api/admin/metrics", headers=admin_headers).json()["counters"].get("pdf_cache.hits", 0)
+
+    second = client.get(url, headers=admin_headers)
+    assert second.content == first.content
+    assert second.headers["etag"] == etag
+    counters = client.get("/api/admin/metrics", headers=admin_headers).json()["counters"]
+    assert counters["pdf_cache.hits"] == hits + 1
+
+    not_modified = client.get(url, headers={**admin_headers, "If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    client.post(
+        f"/api/assessments/{assessment_id}/responses",
+        json={"item_id": "GT03", "support": 2},
+        headers=admin_headers,
+    )
+    changed = client.get(url, headers={**admin_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_reports_zip_export(client):
+    import io
+    import zipfile
+
+    from app.database import SessionLocal
+    from app.models import Plan
+
+    admin_headers = login(client)
+    assessment = client.get("/api/assessments", headers=admin_headers).json()[0]
+    with SessionLocal() as db:
+        plan = Plan(
+            assessment_id=assessment["id"],
+            version=1,
+            generated_by_id=1,
+            content_json="[]",
+            content_text="Obiettivo\nStrategie",
+            is_active=True,
+        )
+        db.add(plan)
+        db.commit()
+        plan_id = plan.id
+
+    assert client.post("/api/exports/reports.zip", json={}, headers=admin_headers).status_code == 400
+
+    response = client.post(
+        "/api/exports/reports.zip",
+        json={"profile_ids": [assessment["profile_id"]]},
+        headers=admin_headers,
+    )
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    names = archive.namelist()
+    assert any(name.endswith(f"_assessment_{assessment['id']}.pdf") for name in names)
+    assert any(name.endswith(f"_plan_{plan_id}.pdf") for name in names)
+    assert all(archive.read(name).startswith(b"%PDF") for name in names)
+
+
+def test_reports_zip_sanitizes_names_and_cancels_pending_renders(client, monkeypatch):
+    from concurrent.futures import Future
+
+    from app import main, reports
+
+    assert main._zip_name("../../etc/passwd") == "_.._etc_passwd"
+    assert main._zip_name("..") == "profilo"
+    assert main._zip_name("P01 àè") == "P01_àè"
+
+    futures = []
+
+    class Pool:
+        def submit(self, fn, *args):
+            future = Future()
+            if not futures:
+                future.set_result(b"%PDF-1.4")
+            futures.append(future)
+            return future
+
+    monkeypatch.setattr(reports, "get_render_pool", lambda: Pool())
+    entries = [(f"{n}.pdf", "assessment", f"zip-cancel-{os.getpid()}-{n}", {}) for n in range(3)]
+    stream = main._zip_stream(entries)
+    next(stream)
+    # il client si disconnette dopo il primo PDF
+    stream.close()
+    assert futures[0].done() and not futures[0].cancelled()
+    assert all(future.cancelled() for future in futures[1:])
+
+
+def test_token_fast_path_and_revocation(client):
+    admin_headers = login(client)
+    created = client.post(
+        "/api/users",
+        json={"username": "revocato", "password": "pw12345", "role": "editor"},
+        headers=admin_headers,
+    ).json()
+    user_headers = login(client, "revocato", "pw12345")
+    assert client.get("/api/users/basic", headers=user_headers).status_code == 200
+
+    # utente già in cache: resta solo la query della lista
+    assert count_queries(lambda: client.get("/api/users/basic", headers=user_headers)) == 1
+    assert client.get("/api/auth/me", headers=user_headers).json()["username"] == "revocato"
+
+    client.patch(
+        f"/api/users/{created['id']}",
+        json={"username": "revocato", "password": "pw12345", "role": "editor", "is_active": False},
+        headers=admin_headers,
+    )
+    assert client.get("/api/users/basic", headers=user_headers).status_code == 401
+
+
+def test_revocation_from_another_process_applies_within_cache_ttl(client):
+    from app import auth
+    from app.database import SessionLocal
+    from app.models import User
+
+    admin_headers = login(client)
+    created = client.post(
+        "/api/users",
+        json={"username": "altroprocesso", "password": "pw12345", "role": "editor"},
+        headers=admin_headers,
+    ).json()
+    user_headers = login(client, "altroprocesso", "pw12345")
+    assert client.get("/api/users/basic", headers=user_headers).status_code == 200
+
+    # revoca fatta da un altro worker: questo processo non riceve l'invalidazione
+    with SessionLocal() as db:
+        db.query(User).filter(User.id == created["id"]).update({User.token_version: User.token_version + 1})
+        db.commit()
+    assert client.get("/api/users/basic", headers=user_headers).status_code == 200
+
+    # scaduto AUTH_CACHE_TTL_SECONDS lo stato viene riletto
+    with auth._user_state_lock:
+        is_active, token_version, _ = auth._user_state_cache[created["id"]]
+        auth._user_state_cache[created["id"]] = (is_active, token_version, 0.0)
+    assert client.get("/api/users/basic", headers=user_headers).status_code == 401
+
+
+def test_login_rehashes_outdated_password_hash(client):
+    from app.auth import pwd_context
+    from app.database import SessionLocal
+    from app.models import User
+
+    admin_headers = login(client)
+    client.post("/api/users", json={"username": "rehash", "password": "pw12345"}, headers=admin_headers)
+    with SessionLocal() as db:
+        user = db.query(User).filter(User.username == "rehash").one()
+        user.password_hash = pwd_context.handler("bcrypt").using(rounds=4).hash("pw12345")
+        db.commit()
+
+    login(client, "rehash", "pw12345")
+    with SessionLocal() as db:
+        stored = db.query(User.password_hash).filter(User.username == "rehash").scalar()
+    assert not pwd_context.needs_update(stored)
+    assert "password_hash" in client.get("/api/admin/metrics", headers=admin_headers).json()["timings"]
+
+
+def test_rate_limiters_share_sliding_window_semantics(client, tmp_path):
+    import time
+
+    from sqlalchemy import create_engine
+
+    from app.models import RateLimitHit
+    from app.ratelimit import DatabaseRateLimiter, MemoryRateLimiter
+
+    memory = MemoryRateLimiter(max_keys=2)
+    assert [memory.hit("user:a", 60, 3) for _ in range(4)] == [1, 2, 3, 4]
+    memory.hit("user:b", 60, 3)
+    memory.hit("user:c", 60, 3)
+    # chiave meno recente eliminata al superamento del limite di chiavi
+    assert memory.hit("user:a", 60, 3) == 1
+    assert memory.hit("user:c", 0, 3) == 1
+    # le chiavi inattive oltre la finestra vengono rimosse senza attendere max_keys
+    idle = MemoryRateLimiter(max_keys=100)
+    idle.hit("user:d", 0.01, 3)
+    idle.hit("user:e", 0.01, 3)
+    time.sleep(0.02)
+    idle.hit("user:f", 0.01, 3)
+    assert list(idle._hits) == ["user:f"]
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'ratelimit.db'}")
+    RateLimitHit.__table__.create(engine)
+    shared = DatabaseRateLimiter(engine)
+    assert [shared.hit("ip:1.2.3.4", 60, 3) for _ in range(3)] == [1, 2, 3]
+    shared.reset("ip:1.2.3.4")
+    assert shared.hit("ip:1.2.3.4", 60, 3) == 1
+    assert shared.count("ip:1.2.3.4", 60) == 1
+
+
+def test_only_failed_logins_use_the_ip_budget(client, monkeypatch):
+    from app.config import get_settings
+
+    settings = get_settings()
+    monkeypatch.setattr(settings, "login_max_attempts_per_ip", 2)
+    # il TestClient e 10.0.0.1 sono proxy fidati: il client è il primo IP non fidato da destra
+    monkeypatch.setattr(settings, "forwarded_allow_ips", "testclient, 10.0.0.1")
+
+    def attempt(password, ip="203.0.113.7"):
+        return client.post(
+            "/api/auth/login",
+            data={"username": "admin", "password": password},
+            headers={"X-Forwarded-For": f"198.51.100.1, {ip}, 10.0.0.1"},
+        ).status_code
+
+    assert [attempt("admin123") for _ in range(4)] == [200] * 4
+    assert [attempt("sbagliata") for _ in range(2)] == [401, 401]
+    assert attempt("admin123") == 429
+    assert attempt("admin123", ip="203.0.113.8") == 200
+
+
+def test_audit_follows_the_caller_transaction(client):
+    from app.audit import log_action
+    from app.database import SessionLocal
+    from app.models import AuditLog
+
+    admin_headers = login(client)
+    with SessionLocal() as db:
+        before = db.query(AuditLog).count()
+        log_action(db, None, "test", "audit", 99, "Voce sincrona.", mode="sync")
+        log_action(db, None, "test", "audit", 100, "Voce annullata.")
+        db.rollback()
+        for index in range(3):
+            log_action(db, None, "test", "audit", index, "Voce in buffer.")
+        log_action(db, None, "test", "audit", 99, "Voce sincrona.", mode="sync")
+        db.commit()
+        assert db.query(AuditLog).filter(AuditLog.entity_id == 99).count() == 1
+
+    entries = client.get("/api/audit?action=test", headers=admin_headers).json()
+    assert {entry["entity_id"] for entry in entries} == {0, 1, 2, 99}
+    with SessionLocal() as db:
+        assert db.query(AuditLog).count() >= before + 4
+
+
+def test_audit_retention_archives_old_months(client):
+    from datetime import datetime, timedelta
+
+    from app.cli import run_audit_retention
+    from app.database import SessionLocal
+    from app.models import AuditLog
+
+    admin_headers = login(client)
+    old = datetime.utcnow() - timedelta(days=800)
+    with SessionLocal() as db:
+        db.add_all(
+            [
+                AuditLog(user_id=1, action="old_export", entity_type="assessment", entity_id=index, created_at=old)
+                for index in range(3)
+            ]
+        )
+        db.commit()
+
+    _created, archived = run_audit_retention(12)
+    assert archived == {old.strftime("%Y-%m"): 3}
+    with SessionLocal() as db:
+        assert db.query(AuditLog).filter(AuditLog.action == "old_export").count() == 0
+
+    hot_only = client.get("/api/audit?action=old_export", headers=admin_headers).json()
+    assert hot_only == []
+    first = client.get("/api/audit?action=old_export&include_archive=true&limit=2", headers=admin_headers)
+    assert [entry["entity_id"] for entry in first.json()] == [2, 1]
+    rest = client.get(
+        f"/api/audit?action=old_export&include_archive=true&limit=2&cursor={first.headers['x-next-cursor']}",
+        headers=admin_headers,
+    ).json()
+    assert [entry["entity_id"] for entry in rest] == [0]
+
+
+def count_commits(fn):
+    import threading
+
+    from sqlalchemy import event
+
+    from app.database import engine
+
+    commits = []
+
+    def record(conn):
+        # il thread di scrittura dell'audit ha le sue transazioni
+        if threading.current_thread().name != "audit-writer":
+            commits.append(conn)
+
+    event.listen(engine, "commit", record)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "commit", record)
+    return len(commits)
+
+
+def test_mutating_requests_commit_once(client):
+    admin_headers = login(client)
+    assessment_id = client.get("/api/assessments", headers=admin_headers).json()[0]["id"]
+    profile_id = client.get("/api/profiles", headers=admin_headers).json()[0]["id"]
+    url = f"/api/assessments/{assessment_id}/responses"
+
+    assert count_commits(lambda: client.post(url, json={"item_id": "AP04", "support": 1}, headers=admin_headers)) == 1
+    assert count_commits(
+        lambda: client.post(f"{url}/bulk", json={"items": [{"item_id": "AP05", "support": 2}]}, headers=admin_headers)
+    ) == 1
+    created = {}
+
+    def create_group():
+        created.update(
+            client.post(
+                "/api/work-groups",
+                json={
+                    "title": "Gruppo UoW",
+                    "item_id": "AP04",
+                    "area_id": "AP",
+                    "member_profile_ids": [profile_id],
+                    "assignee_user_ids": [1],
+                },
+                headers=admin_headers,
+            ).json()
+        )
+
+    assert count_commits(create_group) == 1
+    assert created["members"] == [profile_id]
+
+    assert count_commits(
+        lambda: client.post("/api/assessments/999999/responses", json={"item_id": "AP04", "support": 1}, headers=admin_headers)
+    ) == 0
+
+
+ASYNC_MODE_SCRIPT = """
+from fastapi.testclient import TestClient
+import asyncio
+import threading
+import time
+from app.main import app
+
+# gli handler sincroni restano sincroni (threadpool), login resta async
+route = next(route for route in app.routes if getattr(route, "path", None) == "/api/profiles")
+assert not asyncio.iscoroutinefunction(route.endpoint)
+
+
+@app.get("/api/lento")
+def slow():
+    # lavoro CPU in un handler sincrono
+    deadline = time.monotonic() + 1.5
+    while time.monotonic() < deadline:
+        pass
+    return {"ok": True}
+
+
+app.router.routes.insert(0, app.router.routes.pop())  # prima del mount statico su "/"
+
+with TestClient(app) as client:
+    token = client.post("/api/auth/login", data={"username": "admin", "password": "admin123"}).json()["access_token"]
+    headers = {"Authorization": "Bearer " + token}
+    created = client.post(
+        "/api/profiles",
+        json={"code": "A01", "display_name": "Async", "date_of_birth": "2011-02-03"},
+        headers=headers,
+    )
+    assert created.status_code == 200, created.text
+    codes = [profile["code"] for profile in client.get("/api/profiles", headers=headers).json()]
+    assert codes == ["A01"], codes
+    pdf = client.get("/api/exports/assessment/999.pdf", headers=headers)
+    assert pdf.status_code == 404
+
+    # I/O bloccante (buffer audit, archivi gzip) fuori dal loop
+    import app.main as main
+
+    def flush_off_loop(flush=main.flush_audit):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return flush()
+        raise AssertionError("flush_audit sul loop")
+
+    main.flush_audit = flush_off_loop
+    audit = client.get("/api/audit?include_archive=true", headers=headers)
+    assert audit.status_code == 200, audit.text
+
+    # un handler sincrono lento non blocca le altre richieste (anche async)
+    slow_request = threading.Thread(target=client.get, args=("/api/lento",))
+    slow_request.start()
+    time.sleep(0.2)
+    started = time.monotonic()
+    assert client.get("/api/profiles", headers=headers).status_code == 200
+    relogin = client.post("/api/auth/login", data={"username": "admin", "password": "admin123"})
+    assert relogin.status_code == 200, relogin.text
+    elapsed = time.monotonic() - started
+    slow_request.join()
+    assert elapsed < 1.0, elapsed
+print("ok")
+"""
+
+
+def test_async_database_mode(tmp_path):
+    # processo separato: la modalità si sceglie all'import, dal driver in DATABASE_URL
+    import subprocess
+
+    pytest.importorskip("aiosqlite")
+    backend = Path(__file__).resolve().parents[1]
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite+aiosqlite:///{tmp_path / 'async.db'}",
+        "JOBS_ARTIFACT_DIR": str(tmp_path / "artifacts"),
+        "PDF_CACHE_DIR": str(tmp_path / "pdf-cache"),
+        "AUDIT_ARCHIVE_DIR": str(tmp_path / "audit-archive"),
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", ASYNC_MODE_SCRIPT], cwd=backend, env=env, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith("ok")
+
+
+def test_sqlite_engine_profile(client):
+    from app.database import describe_engine, engine
+
+    config = describe_engine(engine)
+    assert config["journal_mode"] == "wal"
+    assert config["synchronous"] == 1  # NORMAL
+    assert config["busy_timeout"] == 5000
+    assert config["cache_size"] == -20000
+    assert config["pool"] == "QueuePool" and config["pool_size"] == 5
+
+
+def test_sqlite_writer_group_commit(tmp_path):
+    import threading
+    import time
+
+    from sqlalchemy import event, text
+
+    from app.sqlitewriter import SQLiteWriter, create_writer_engine
+
+    writer_engine = create_writer_engine(f"sqlite:///{tmp_path / 'writer.db'}")
+    with writer_engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE t (value INTEGER)")
+    writer = SQLiteWriter(writer_engine, max_queue=64, group_size=50, max_delay_seconds=5)
+    commits = []
+    event.listen(writer_engine, "commit", lambda conn: commits.append(1))
+    start = threading.Barrier(20)
+    errors = []
+
+    def write(value):
+        start.wait()
+        try:
+            with writer.transaction() as conn:
+                conn.execute(text("INSERT INTO t VALUES (:v)"), {"v": value})
+                time.sleep(0.005)  # gli altri thread si accodano
+                if value == 7:
+                    raise ValueError("annullata")
+        except ValueError as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=write, args=(value,)) for value in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with writer_engine.connect() as conn:
+        values = sorted(row[0] for row in conn.exec_driver_sql("SELECT value FROM t"))
+    # l'errore annulla solo il proprio savepoint; più transazioni per commit
+    assert values == [value for value in range(20) if value != 7]
+    assert len(errors) == 1
+    assert 1 <= len(commits) < 20
+
+
+def test_sqlite_writer_sessions_through_get_db(client, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import date
+
+    from app import auth
+    from app.config import get_settings
+    from app.database import SessionLocal, after_commit
+    from app.models import Profile
+    from app.sqlitewriter import SQLiteWriter, create_writer_engine
+
+    writer = SQLiteWriter(create_writer_engine(get_settings().database_url), max_queue=64, group_size=50, max_delay_seconds=0.02)
+    monkeypatch.setattr(auth, "get_sqlite_writer", lambda: writer)
+    try:
+        headers = login(client)
+        profile = client.post(
+            "/api/profiles",
+            json={"code": "W01", "display_name": "Writer", "date_of_birth": "2014-04-04"},
+            headers=headers,
+        ).json()
+        assessment = client.post(
+            "/api/assessments",
+            json={"profile_id": profile["id"], "assessment_date": "2024-04-04", "operator_name": "Op", "operator_role": "Ed"},
+            headers=headers,
+        ).json()
+        url = f"/api/assessments/{assessment['id']}/responses"
+        payloads = [{"item_id": "AP04" if n % 2 else "AP03", "support": n % 3} for n in range(20)]
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            statuses = list(pool.map(lambda payload: client.post(url, json=payload, headers=headers).status_code, payloads))
+        assert statuses == [200] * 20
+        check = client.post(f"/api/admin/area-scores/check?assessment_id={assessment['id']}", headers=headers).json()
+        assert check["drifted"] == []
+
+        # rollback dopo un flush: annulla solo il savepoint della sessione
+        db = writer.session(write=True)
+        db.add(Profile(code="W02", display_name="Annullato", date_of_birth=date(2014, 4, 4)))
+        db.flush()
+        db.rollback()
+        db.close()
+
+        # after_commit parte a commit di gruppo avvenuto, nell'ordine di registrazione
+        seen = []
+
+        def visible(label):
+            reader = SessionLocal()
+            try:
+                seen.append((label, reader.query(Profile).filter(Profile.code == "W03").count()))
+            finally:
+                reader.close()
+
+        db = writer.session(write=True)
+        db.add(Profile(code="W03", display_name="Confermato", date_of_birth=date(2014, 4, 4)))
+        after_commit(db, lambda: visible("primo"))
+        after_commit(db, lambda: visible("secondo"))
+        db.commit()
+        db.close()
+        assert seen == [("primo", 1), ("secondo", 1)]
+
+        reader = SessionLocal()
+        try:
+            assert reader.query(Profile).filter(Profile.code.in_(["W02", "W03"])).count() == 1
+        finally:
+            reader.close()
+    finally:
+        if writer.connection is not None:
+            writer.connection.close()
+        writer.engine.dispose()
+
+
+def test_read_replica_routing_and_read_your_writes(client, tmp_path, monkeypatch):
+    import time
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app import replica
+    from app.database import AppSession, Base
+
+    # replica ancora vuota: non ha ricevuto le scritture del primario
+    stale = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    Base.metadata.create_all(stale)
+    monkeypatch.setattr(replica, "ReadSessionLocal", sessionmaker(bind=stale, class_=AppSession))
+
+    headers = login(client)
+    profile = client.post(
+        "/api/profiles",
+        json={"code": "R01", "display_name": "Replica", "date_of_birth": "2012-01-01"},
+        headers=headers,
+    ).json()
+    client.post(
+        "/api/assessments",
+        json={"profile_id": profile["id"], "assessment_date": "2024-03-01", "operator_name": "Op", "operator_role": "Ed"},
+        headers=headers,
+    )
+    payload = {"profile_ids": [profile["id"]]}
+
+    assert client.post("/api/exports/reports.zip", json=payload, headers=headers).status_code == 404
+    fresh = {**headers, "Cookie": f"{replica.READ_YOUR_WRITES_COOKIE}={time.time() + 5}"}
+    assert client.post("/api/exports/reports.zip", json=payload, headers=fresh).status_code == 200
+    expired = {**headers, "Cookie": f"{replica.READ_YOUR_WRITES_COOKIE}={time.time() - 1}"}
+    assert client.post("/api/exports/reports.zip", json=payload, headers=expired).status_code == 404
+
+
+READ_REPLICA_SCRIPT = """
+import os
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+from app.database import Base
+from app.main import app
+from app.replica import READ_YOUR_WRITES_COOKIE
+
+# replica vuota: non riceve le scritture del primario
+Base.metadata.create_all(create_engine(os.environ["READ_DATABASE_URL"]))
+with TestClient(app) as client:
+    login = client.post("/api/auth/login", data={"username": "admin", "password": "admin123"})
+    assert READ_YOUR_WRITES_COOKIE not in login.cookies
+    headers = {"Authorization": "Bearer " + login.json()["access_token"]}
+    profile = client.post(
+        "/api/profiles",
+        json={"code": "R01", "display_name": "Replica", "date_of_birth": "2012-01-01"},
+        headers=headers,
+    )
+    assert READ_YOUR_WRITES_COOKIE in profile.cookies
+    client.post(
+        "/api/assessments",
+        json={"profile_id": profile.json()["id"], "assessment_date": "2024-03-01", "operator_name": "Op", "operator_role": "Ed"},
+        headers=headers,
+    )
+    payload = {"profile_ids": [profile.json()["id"]]}
+    # subito dopo la scrittura le letture restano sul primario
+    exported = client.post("/api/exports/reports.zip", json=payload, headers=headers)
+    assert exported.status_code == 200, exported.text
+    assert READ_YOUR_WRITES_COOKIE not in exported.cookies
+    client.cookies.clear()
+    assert client.post("/api/exports/reports.zip", json=payload, headers=headers).status_code == 404
+print("ok")
+"""
+
+
+def test_read_your_writes_cookie_from_the_middleware(tmp_path):
+    # processo separato: il middleware si registra all'import solo con READ_DATABASE_URL
+    import subprocess
+
+    backend = Path(__file__).resolve().parents[1]
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tmp_path / 'primary.db'}",
+        "READ_DATABASE_URL": f"sqlite:///{tmp_path / 'replica.db'}",
+        "JOBS_ARTIFACT_DIR": str(tmp_path / "artifacts"),
+        "PDF_CACHE_DIR": str(tmp_path / "pdf-cache"),
+        "AUDIT_ARCHIVE_DIR": str(tmp_path / "audit-archive"),
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", READ_REPLICA_SCRIPT], cwd=backend, env=env, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith("ok")
+
+
+def test_conditional_get_for_lists_and_checklist(client):
+    headers = login(client)
+    first = client.get("/api/profiles", headers=headers)
+    etag = first.headers["etag"]
+    assert first.headers["last-modified"]
+    cached = client.get("/api/profiles", headers={**headers, "If-None-Match": etag})
+    assert cached.status_code == 304 and cached.content == b""
+    # parametri diversi -> rappresentazione diversa
+    assert client.get("/api/profiles?limit=1", headers=headers).headers["etag"] != etag
+
+    client.post(
+        "/api/profiles",
+        json={"code": "E01", "display_name": "Etag", "date_of_birth": "2013-04-04"},
+        headers=headers,
+    )
+    changed = client.get("/api/profiles", headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assessments = client.get("/api/assessments", headers=headers).headers["etag"]
+    assert client.get("/api/assessments", headers={**headers, "If-None-Match": assessments}).status_code == 304
+
+    # contatore incrementato nella stessa transazione; un callback after_commit
+    # che fallisce non salta i successivi
+    from datetime import date
+
+    from app.database import SessionLocal, after_commit
+    from app.models import Profile, TableVersion
+
+    def version():
+        reader = SessionLocal()
+        try:
+            return reader.get(TableVersion, "profiles").version
+        finally:
+            reader.close()
+
+    before = version()
+    db = SessionLocal()
+    db.add(Profile(code="E02", display_name="Annullato", date_of_birth=date(2013, 4, 4)))
+    db.flush()
+    db.rollback()
+    assert version() == before
+    ran = []
+    db.add(Profile(code="E03", display_name="Confermato", date_of_birth=date(2013, 4, 4)))
+    after_commit(db, lambda: 1 / 0)
+    after_commit(db, lambda: ran.append(version()))
+    db.commit()
+    db.close()
+    assert ran == [before + 1]
+
+    checklist = client.get("/api/checklist")
+    assert checklist.json()["version"]
+    assert "max-age" in checklist.headers["cache-control"]
+    assert client.get("/api/checklist", headers={"If-None-Match": checklist.headers["etag"]}).status_code == 304
+
+
+def test_row_serializer_matches_response_model(client, monkeypatch):
+    import json
+
+    from pydantic import TypeAdapter
+
+    from app import fastjson
+    from app.database import SessionLocal
+    from app.main import ASSESSMENT_ROWS
+    from app.models import Assessment
+    from app.schemas import AssessmentOut
+
+    headers = login(client)
+    profile = client.post(
+        "/api/profiles",
+        json={"code": "J01", "display_name": "Json", "date_of_birth": "2014-05-05"},
+        headers=headers,
+    ).json()
+    client.post(
+        "/api/assessments",
+        json={
+            "profile_id": profile["id"],
+            "assessment_date": "2024-05-05",
+            "operator_name": "Op",
+            "operator_role": "Ed",
+            "present_user_ids": [1],
+        },
+        headers=headers,
+    )
+    listed = client.get("/api/assessments", headers=headers)
+    assert listed.headers["content-type"] == "application/json"
+    assert listed.json()
+
+    db = SessionLocal()
+    try:
+        adapter = TypeAdapter(list[AssessmentOut])
+        instances = adapter.validate_python(db.query(Assessment).order_by(Assessment.id).all(), from_attributes=True)
+        expected = json.loads(adapter.dump_json(instances))
+        rows = ASSESSMENT_ROWS.query(db).order_by(Assessment.id).all()
+    finally:
+        db.close()
+    assert json.loads(ASSESSMENT_ROWS.dumps(rows)) == expected
+    monkeypatch.setattr(fastjson, "orjson", None)
+    assert json.loads(ASSESSMENT_ROWS.dumps(rows)) == expected
+
+    audit = client.get("/api/audit?action=login&limit=5", headers=headers).json()
+    assert audit and all(entry["actor_user_id"] for entry in audit)
+
+
+def test_sparse_fieldsets_and_plan_detail(client):
+    headers = login(client)
+    profile = client.post(
+        "/api/profiles",
+        json={"code": "F01", "display_name": "Fields", "date_of_birth": "2015-06-06"},
+        headers=headers,
+    ).json()
+    assessment = client.post(
+        "/api/assessments",
+        json={
+            "profile_id": profile["id"],
+            "assessment_date": "2024-06-06",
+            "operator_name": "Op",
+            "operator_role": "Ed",
+            "session_notes": "Note lunghe della sessione",
+        },
+        headers=headers,
+    ).json()
+    url = f"/api/assessments?profile_id={profile['id']}"
+
+    summary = client.get(url, headers=headers).json()[0]
+    assert "session_notes" not in summary and summary["status"] == "draft"
+    assert client.get(f"{url}&fields=all", headers=headers).json()[0]["session_notes"] == "Note lunghe della sessione"
+    assert client.get(f"{url}&fields=status,session_notes", headers=headers).json() == [
+        {"id": assessment["id"], "status": "draft", "session_notes": "Note lunghe della sessione"}
+    ]
+    assert client.get(f"{url}&fields=password", headers=headers).status_code == 400
+
+    plan = client.post(f"/api/assessments/{assessment['id']}/plans", headers=headers).json()
+    assert isinstance(plan["content_json"], list)
+    listed = client.get(f"/api/assessments/{assessment['id']}/plans", headers=headers).json()
+    assert listed[0]["version"] == 1 and "content_text" not in listed[0]
+    full = client.get(f"/api/assessments/{assessment['id']}/plans?fields=content_json", headers=headers).json()
+    assert full[0]["content_json"] == plan["content_json"]
+    detail = client.get(f"/api/plans/{plan['id']}", headers=headers).json()
+    assert detail["content_text"] == plan["content_text"]
+    assert client.get("/api/plans/999999", headers=headers).status_code == 404
+
+
+def test_compression_and_precompressed_static(client, tmp_path):
+    import gzip
+
+    from starlette.applications import Starlette
+
+    from app.staticassets import STATIC_SOURCE_DIR, PrecompressedStaticFiles, build_static
+
+    checklist = client.get("/api/checklist", headers={"Accept-Encoding": "gzip"})
+    assert checklist.headers["content-encoding"] == "gzip"
+    assert checklist.headers["etag"].startswith('W/"') and "Accept-Encoding" in checklist.headers["vary"]
+    assert checklist.json()
+    assert client.get("/api/checklist", headers={"If-None-Match": checklist.headers["etag"]}).status_code == 304
+    assert "content-encoding" not in client.get("/health", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/api/checklist", headers={"Accept-Encoding": "identity"}).headers
+
+    manifest = build_static(STATIC_SOURCE_DIR, tmp_path / "dist")
+    script = manifest["app.js"]
+    assert script.startswith("app.") and script != "app.js"
+    assert f'src="/{script}"' in (tmp_path / "dist" / "index.html").read_text(encoding="utf-8")
+
+    static = TestClient(Starlette())
+    static.app.mount("/", PrecompressedStaticFiles(directory=tmp_path / "dist", html=True))
+    hashed = static.get(f"/{script}", headers={"Accept-Encoding": "gzip"})
+    assert hashed.headers["content-encoding"] == "gzip"
+    assert hashed.headers["content-type"].startswith("text/javascript")
+    assert "immutable" in hashed.headers["cache-control"]
+    assert hashed.content == (STATIC_SOURCE_DIR / "app.js").read_bytes()
+    assert gzip.decompress((tmp_path / "dist" / f"{script}.gz").read_bytes()) == hashed.content
+    index = static.get("/", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in index.headers and index.headers["cache-control"] == "no-cache"
+    revalidated = static.get("/", headers={"Accept-Encoding": "identity", "If-None-Match": index.headers["etag"]})
+    assert revalidated.status_code == 304